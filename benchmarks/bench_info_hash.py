@@ -0,0 +1,85 @@
+"""Compares info-hash computation from .torrent file contents
+by bencode scanning (`get_info_hash()`) with libtorrent decoding.
+
+Usage: python benchmarks/bench_info_hash.py [files count] [repeats]
+
+"""
+import os
+import sys
+import hashlib
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from updatorr.utils import get_info_hash
+
+try:
+    from deluge._libtorrent import lt
+except ImportError:
+    lt = None
+
+from tests.bencode import bencode, make_torrent
+
+
+def bdecode(contents, pos=0):
+    """Returns a tuple (decoded value, end position): a naive
+    pure-Python decoder used as a baseline when libtorrent is missing.
+
+    """
+    char = contents[pos]
+    if char == 'i':
+        end = contents.index('e', pos)
+        return int(contents[pos + 1:end]), end + 1
+    if char == 'l':
+        pos += 1
+        value = []
+        while contents[pos] != 'e':
+            item, pos = bdecode(contents, pos)
+            value.append(item)
+        return value, pos + 1
+    if char == 'd':
+        pos += 1
+        value = {}
+        while contents[pos] != 'e':
+            key, pos = bdecode(contents, pos)
+            value[key], pos = bdecode(contents, pos)
+        return value, pos + 1
+    colon = contents.index(':', pos)
+    end = colon + 1 + int(contents[pos:colon])
+    return contents[colon + 1:end], end
+
+
+def decode_info_hash(contents):
+    return hashlib.sha1(bencode(bdecode(contents)[0]['info'])).hexdigest()
+
+
+def lt_info_hash(contents):
+    return str(lt.torrent_info(lt.bdecode(contents)).info_hash())
+
+
+def bench(name, func, contents, repeats):
+    best = min(timeit.repeat(lambda: func(contents), number=repeats, repeat=3)) / repeats
+    print '%-32s %10.3f ms' % (name, best * 1000)
+    return func(contents)
+
+
+def main(files_count=5000, repeats=20):
+    contents, info = make_torrent(files_count)
+    print 'Torrent with %s files, %s KiB' % (files_count, len(contents) // 1024)
+    expected = hashlib.sha1(bencode(info)).hexdigest()
+
+    results = [bench('get_info_hash() (scanning)', get_info_hash, contents, repeats),
+               bench('pure-Python decode + encode', decode_info_hash, contents, repeats)]
+    if lt is None:
+        print 'libtorrent is not available, its decoding is not measured'
+    else:
+        results.append(bench('lt.bdecode() + lt.torrent_info()', lt_info_hash, contents, repeats))
+
+    if [result for result in results if result != expected]:
+        print 'Info-hash MISMATCH: %s' % ', '.join(results)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,39 @@
+def bencode(value):
+    """Returns bencoded string of `value` (dict, list, int or str)
+    used to build torrent contents in tests and benchmarks.
+
+    """
+    if isinstance(value, dict):
+        return 'd%se' % ''.join(bencode(key) + bencode(value[key]) for key in sorted(value))
+    if isinstance(value, (list, tuple)):
+        return 'l%se' % ''.join(bencode(item) for item in value)
+    if isinstance(value, (int, long)):
+        return 'i%se' % value
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return '%s:%s' % (len(value), value)
+
+
+def make_torrent(files_count, piece_length=262144, **extra):
+    """Returns a tuple (torrent contents, info dictionary) for
+    a synthetic multi-file torrent with `files_count` files.
+
+    """
+    files = [{'length': 1000 + idx, 'path': ['dir %s' % (idx % 10), 'file %s.bin' % idx]}
+             for idx in range(files_count)]
+    total_length = sum(a_file['length'] for a_file in files)
+    pieces_count = total_length // piece_length + 1
+    info = {
+        'name': 'Synthetic torrent',
+        'piece length': piece_length,
+        'pieces': ''.join(chr(idx % 256) * 20 for idx in range(pieces_count)),
+        'files': files,
+    }
+    metadata = {
+        'announce': 'http://bt.tracker.test/ann',
+        'comment': 'http://tracker.test/forum/viewtopic.php?t=1',
+        'creation date': 1356000000,
+        'info': info,
+    }
+    metadata.update(extra)
+    return bencode(metadata), info
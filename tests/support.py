@@ -0,0 +1,72 @@
+import atexit
+import threading
+import BaseHTTPServer
+
+from urlparse import urlsplit, parse_qs
+
+from twisted.internet import reactor
+
+_reactor_thread = None
+
+
+def start_reactor():
+    """Runs Twisted reactor in a background thread (as Deluge does in its main one),
+    so that blocking requests could be issued from test threads.
+
+    """
+    global _reactor_thread
+    if _reactor_thread is not None:
+        return
+    _reactor_thread = threading.Thread(target=reactor.run, kwargs={'installSignalHandlers': False})
+    _reactor_thread.daemon = True
+    _reactor_thread.start()
+    atexit.register(stop_reactor)
+
+
+def stop_reactor():
+    reactor.callFromThread(reactor.stop)
+    _reactor_thread.join(5)
+
+
+class FakeServer(object):
+    """HTTP server listening on a random local port in a background thread.
+
+    `respond` is a callable accepting (path, query dictionary) and returning
+    a tuple (status code, body) or (status code, body, headers dictionary).
+    Paths and headers of requests served are kept in `requests` and `headers`.
+
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.headers = []
+        server = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                server.requests.append(self.path)
+                server.headers.append(dict(self.headers))
+                response = server.respond(url.path, parse_qs(url.query))
+                code, body = response[:2]
+                self.send_response(code)
+                for name, value in (response[2:] or [{}])[0].items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%s' % self._httpd.server_port
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
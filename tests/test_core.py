@@ -0,0 +1,217 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+from updatorr.core import Core, UpdatorrErrorEvent
+from updatorr.handler_base import NOT_MODIFIED
+from updatorr.sessions import SESSIONS
+from updatorr.scheduler import UpdatesScheduler
+from updatorr.utils import get_info_hash
+
+from tests.bencode import make_torrent
+
+
+class FakeHandler(object):
+    """Tracker handler returning the given .torrent file contents."""
+
+    tracker_host = 'tracker.test'
+    resource_url = 'http://tracker.test/forum/viewtopic.php?t=1'
+
+    def __init__(self, contents, torrent_hashes):
+        self.contents = contents
+        self.torrent_hashes = set(torrent_hashes)
+
+    def get_torrent_file(self):
+        return self.contents
+
+    def get_error_text(self):
+        return ''
+
+    def get_page_state(self):
+        return {'etag': '"v1"'}
+
+
+class PageStates(dict):
+    """In-memory stand-in for PageCache."""
+
+    def set(self, url, state):
+        self[url] = state
+
+
+class CoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.core = Core.__new__(Core)
+        self.core.config = {'store_tmp_torrents': False}
+        self.core.trackers_settings = {'tracker.test': {}}
+        self.core.scheduler = UpdatesScheduler(3600)
+        self.core.stats_lock = threading.Lock()
+        self.core.saved_requests = 0
+        self.events = []
+        self.core.emit_event = self.events.append
+        self.core.mark_config_dirty = lambda: self.events.append('config changed')
+        self.updated = []
+        self.core.update_torrent = lambda torrent_data, contents, info: self.updated.append(info['hash']) or True
+        self.core.page_cache = PageStates()
+        self.torrents = [{'hash': 'a' * 40, 'name': 'A'}, {'hash': 'b' * 40, 'name': 'B'}]
+
+    def check(self, contents):
+        handler = FakeHandler(contents, [torrent_data['hash'] for torrent_data in self.torrents])
+        self.core.check_torrents((handler, self.torrents))
+        return [event.args for event in self.events if isinstance(event, UpdatorrErrorEvent)]
+
+    def set_hash(self, contents):
+        for torrent_data in self.torrents:
+            torrent_data['hash'] = get_info_hash(contents)
+
+
+class CheckTorrentsTest(CoreTestCase):
+
+    def test_not_torrent(self):
+        for contents in ('<html><body>Login</body></html>', 'd8:announce4:http', 'd4:infoi1ee', 'data.torrent'):
+            del self.events[:]
+            errors = self.check(contents)
+            self.assertEqual([torrent_id for torrent_id, text in errors], ['a' * 40, 'b' * 40])
+            self.assertTrue('is not a .torrent file' in errors[0][1])
+        self.assertEqual(self.updated, [])
+
+    def test_torrent_filepath(self):
+        contents = make_torrent(3)[0]
+        fd, filepath = tempfile.mkstemp()
+        os.write(fd, contents)
+        os.close(fd)
+        self.assertEqual(self.check(filepath), [])
+        self.assertEqual(self.updated, [get_info_hash(contents)] * 2)
+        self.assertFalse(os.path.exists(filepath))
+
+    def test_torrent_contents(self):
+        contents = make_torrent(3)[0]
+        self.assertEqual(self.check(contents), [])
+        self.assertEqual(self.updated, [get_info_hash(contents)] * 2)
+        # Page is confirmed for the new torrent only.
+        self.assertEqual(self.core.page_cache[FakeHandler.resource_url],
+                         {'etag': '"v1"', 'hashes': [get_info_hash(contents)]})
+
+    def test_not_modified(self):
+        self.assertEqual(self.check(NOT_MODIFIED), [])
+        self.assertEqual(self.core.page_cache[FakeHandler.resource_url],
+                         {'etag': '"v1"', 'hashes': ['a' * 40, 'b' * 40]})
+
+
+class PersistCookiesTest(CoreTestCase):
+
+    def setUp(self):
+        CoreTestCase.setUp(self)
+        self.session = SESSIONS.reset_session('tracker.test')
+        self.session.cookies.add('uid', '1')
+
+    def check_persisted(self, contents):
+        self.check(contents)
+        self.assertEqual(self.core.trackers_settings['tracker.test']['cookies'], self.session.cookies.to_dict())
+        self.assertTrue('config changed' in self.events)
+        self.assertFalse(self.session.cookies.dirty)
+
+    def test_not_modified(self):
+        self.check_persisted(NOT_MODIFIED)
+
+    def test_error(self):
+        self.check_persisted(None)
+
+    def test_torrent(self):
+        contents = make_torrent(1)[0]
+        self.set_hash(contents)
+        self.check_persisted(contents)
+
+    def test_unchanged(self):
+        self.session.cookies.dirty = False
+        self.check(NOT_MODIFIED)
+        self.assertFalse('cookies' in self.core.trackers_settings['tracker.test'])
+        self.assertFalse('config changed' in self.events)
+
+    def test_all_trackers(self):
+        self.assertTrue(self.core.persist_cookies())
+        self.assertTrue(self.core.trackers_settings['tracker.test']['cookies'])
+        self.assertFalse(self.core.persist_cookies())
+
+
+class TrickleProgressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.core = Core.__new__(Core)
+        self.core.walk_period = 1
+        self.core.trickle = True
+        self.core.trickle_start = 1000
+        self.core.scheduler = UpdatesScheduler(3600)
+        # Two torrents due within the first hour of trickle mode, one in the second hour.
+        for idx, next_check in enumerate([1000, 2000, 5000]):
+            self.core.scheduler.add('t%s' % idx, next_check)
+
+    def test_progress(self):
+        self.assertEqual(self.core.get_trickle_progress(now=1500), 0.0)
+        self.core.scheduler.pop_due(now=1500)
+        self.core.scheduler.checked('t0', False, now=1500)
+        self.assertEqual(self.core.get_trickle_progress(now=1600), 0.5)
+        self.core.scheduler.pop_due(now=2500)
+        self.core.scheduler.checked('t1', False, now=2500)
+        self.assertEqual(self.core.get_trickle_progress(now=4000), 1.0)
+        # The next cycle is counted from trickle mode start rather than from the epoch.
+        self.assertEqual(self.core.get_trickle_progress(now=4700), 0.0)
+
+    def test_off(self):
+        self.core.trickle = False
+        self.assertEqual(self.core.get_trickle_progress(), None)
+
+
+class RunWalkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.core = Core.__new__(Core)
+        self.core.walking = False
+        self.core.walk_period = 1
+        self.core.trickle = False
+        self.core.last_walk = time.time()
+        self.core.scheduler = UpdatesScheduler(3600)
+        self.core.scheduler.add('t0')
+        self.walks = []
+        self.walked = threading.Event()
+
+        def walk(**kwargs):
+            self.walks.append(kwargs)
+            self.walked.set()
+        self.core.walk = walk
+
+    def run_walker(self, **kwargs):
+        self.assertTrue(self.core.run_walker(**kwargs))
+        self.walked.wait(5)
+        return self.walks.pop()
+
+    def test_scheduled(self):
+        # A walk period is not passed since the last walk.
+        walk = self.run_walker()
+        self.assertEqual((walk['quiet'], walk['cycle']), (True, False))
+
+    def test_cycle(self):
+        self.core.last_walk -= 3600
+        walk = self.run_walker()
+        self.assertEqual((walk['quiet'], walk['cycle']), (False, True))
+
+    def test_trickle_cycle(self):
+        self.core.trickle = True
+        self.core.get_trickle_slice = lambda: 10
+        self.core.last_walk -= 3600
+        walk = self.run_walker()
+        self.assertEqual((walk['quiet'], walk['cycle']), (True, True))
+
+    def test_forced(self):
+        walk = self.run_walker(force=True)
+        self.assertEqual((walk['quiet'], walk['cycle']), (False, False))
+
+    def test_nothing_due(self):
+        self.core.scheduler.pop_due()
+        self.assertFalse(self.core.run_walker())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import time
+import unittest
+
+from updatorr.feeds import FeedIndex
+
+
+class FakeFeedHandler(object):
+    """Tracker handler serving feeds from `feeds` dictionary:
+    {feed URL: parsed entries or None on failure}.
+
+    """
+
+    tracker_host = 'tracker.example.org'
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.requests = []
+
+    def get_feed_urls(self):
+        return sorted(self.feeds)
+
+    def get_resource(self, url):
+        self.requests.append(url)
+        return {}, url
+
+    def parse_feed(self, contents):
+        return self.feeds[contents]
+
+
+class FeedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = FeedIndex(max_age=600)
+        self.host = FakeFeedHandler.tracker_host
+
+    def test_is_updated(self):
+        handler = FakeFeedHandler({'http://tracker.example.org/rss': {
+            '1': {'link': 'http://tracker.example.org/1', 'updated': 1000},
+            '2': {'link': 'http://tracker.example.org/2', 'updated': 2000},
+        }})
+        self.assertEqual(self.index.is_updated(self.host, '1', 1500), None)
+        self.assertTrue(self.index.update(handler))
+        self.assertTrue(self.index.is_updated(self.host, '2', 1500))
+        self.assertTrue(self.index.is_updated(self.host, '2', 2000))
+        self.assertFalse(self.index.is_updated(self.host, '2', 2001))
+        self.assertFalse(self.index.is_updated(self.host, '1', 1500))
+        # Thread is not listed in feeds reaching back to the last check.
+        self.assertFalse(self.index.is_updated(self.host, '3', 1500))
+        self.assertEqual(self.index.is_updated(self.host, None, 1500), None)
+
+    def test_since(self):
+        handler = FakeFeedHandler({
+            'http://tracker.example.org/rss/1': {'1': {'link': 'http://tracker.example.org/1', 'updated': 1000}},
+            'http://tracker.example.org/rss/2': {'2': {'link': 'http://tracker.example.org/2', 'updated': 3000}},
+        })
+        self.assertTrue(self.index.update(handler))
+        # The latest of feeds oldest items bounds the index.
+        self.assertEqual(self.index.is_updated(self.host, '3', 2999), None)
+        self.assertFalse(self.index.is_updated(self.host, '3', 3000))
+        self.assertTrue(self.index.is_updated(self.host, '2', 3000))
+
+    def test_fresh(self):
+        handler = FakeFeedHandler({'http://tracker.example.org/rss': {
+            '1': {'link': 'http://tracker.example.org/1', 'updated': 1000}}})
+        self.assertTrue(self.index.update(handler))
+        fetched = self.index.get_fetched(self.host)
+        self.assertTrue(self.index.update(handler))
+        self.assertEqual(len(handler.requests), 1)
+        self.assertEqual(self.index.get_fetched(self.host), fetched)
+
+    def test_failure_cached(self):
+        handler = FakeFeedHandler({'http://tracker.example.org/rss': None})
+        self.assertFalse(self.index.update(handler))
+        self.assertFalse(self.index.update(handler))
+        self.assertEqual(len(handler.requests), 1)
+        self.assertEqual(self.index.get_fetched(self.host), None)
+        # Feed is fetched again once failure is expired.
+        self.index._failed[self.host] = time.time() - 601
+        handler.feeds['http://tracker.example.org/rss'] = {'1': {'link': 'http://tracker.example.org/1', 'updated': 1000}}
+        self.assertTrue(self.index.update(handler))
+        self.assertEqual(len(handler.requests), 2)
+        self.assertFalse(self.index.is_updated(self.host, '1', 1000.5))
+
+    def test_partial_failure(self):
+        handler = FakeFeedHandler({
+            'http://tracker.example.org/rss/1': {'1': {'link': 'http://tracker.example.org/1', 'updated': 1000}},
+            'http://tracker.example.org/rss/2': None,
+        })
+        self.assertFalse(self.index.update(handler))
+        # Incomplete index is not kept.
+        self.assertEqual(self.index.is_updated(self.host, '1', 1000), None)
+        self.assertFalse(self.index.update(handler))
+        self.assertEqual(len(handler.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import logging
+import unittest
+
+from updatorr.handler_base import NOT_MODIFIED, PageFingerprint, PageUnchanged
+from updatorr.http_client import get_client
+from updatorr.tracker_handlers.handler_anidub import AnidubHandler
+from updatorr.tracker_handlers.handler_rutor import RutorHandler
+from updatorr.tracker_handlers.handler_rutracker import RutrackerHandler
+
+from tests.support import FakeServer, start_reactor
+
+log = logging.getLogger(__name__)
+
+# Thread pages with release description, counters and an optional magnet link.
+RUTRACKER_PAGE = '''<html><head><script>var BB = {sid: "%(views)s"};</script></head><body>
+<h1 class="maintitle">Release</h1><p>Views: %(views)s</p>
+<div class="post_wrap"><div class="post_body" id="p-1">%(description)s
+<table class="attach bordered med">
+<tr><td><a href="http://dl.rutracker.org/forum/dl.php?t=1" class="dl-stub">Download</a></td></tr>
+<tr><td>Downloaded: <b>%(downloads)s</b></td></tr>
+<tr><td>%(magnet)s</td></tr></table></div></div>
+<div id="t-tor-stats">Seeders: <b>%(seeders)s</b></div></body></html>'''
+
+ANIDUB_PAGE = '''<html><body><table>
+<tr><td class="heading">Download</td><td><a class="index" href="download.php?id=1&amp;name=x.torrent">x.torrent</a></td></tr>
+<tr><td class="heading">Info hash</td><td>%(magnet)s</td></tr>
+<tr><td class="heading">Description</td><td>%(description)s</td></tr>
+<tr><td class="heading">\xd2\xe8\xef</td><td>TV</td></tr>
+<tr><td class="heading">Seeders</td><td>%(seeders)s</td></tr>
+<tr><td class="heading">Views</td><td>%(views)s</td></tr>
+<tr><td class="heading">Snatched</td><td>%(downloads)s</td></tr>
+</table></body></html>'''
+
+RUTOR_PAGE = '''<html><body><h1>Release</h1>
+<div id="download">%(magnet)s<a href="http://d.rutor.org/download/1">Download</a></div>
+<table id="details"><tr><td></td><td>%(description)s</td></tr>
+<tr><td class="header">Uploader</td><td>someone</td></tr>
+<tr><td class="header">Seeders</td><td>%(seeders)s</td></tr>
+<tr><td class="header">Leechers</td><td>%(downloads)s (%(views)s)</td></tr>
+</table></body></html>'''
+
+# Filler making pages span several chunks.
+DESCRIPTION = 'Episodes 1-12 of 24. ' + 'Lorem ipsum dolor sit amet. ' * 2000
+TORRENT_HASH = 'a' * 40
+
+
+class FingerprintMarkersTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.page = ''
+        self.server = FakeServer(lambda path, query: (200, self.page))
+        get_client().configure_limits({'127.0.0.1': {'rate': 100, 'burst': 100}})
+
+    def tearDown(self):
+        self.server.stop()
+
+    def get_link(self, handler_cls, path, template, page_state=None, **values):
+        """Returns a tuple (download link, page state) got
+        from a page by a handler, or (None, None) if page is unchanged.
+
+        """
+        page_values = {'description': DESCRIPTION, 'views': 100, 'seeders': 10, 'downloads': 1000, 'magnet': ''}
+        page_values.update(values)
+        self.page = template % page_values
+        handler = handler_cls(handler_cls.__name__, {'hash': TORRENT_HASH, 'comment': self.server.url + path}, log)
+        handler.set_settings({})
+        handler.set_page_state(page_state)
+        try:
+            link = handler.get_download_link()
+        except PageUnchanged:
+            return None, None
+        # Torrent is confirmed against the page (see `Core.store_page_state()`).
+        return link, dict(handler.get_page_state(), hashes=[TORRENT_HASH])
+
+    def check_markers(self, handler_cls, path, template):
+        link, page_state = self.get_link(handler_cls, path, template)
+        self.assertTrue(link)
+        self.assertTrue(page_state.get('fingerprint'))
+        # Counters only are changed.
+        self.assertEqual(self.get_link(handler_cls, path, template, page_state,
+                                       views=1500, seeders=3, downloads=2400), (None, None))
+        # Release is changed.
+        link, new_page_state = self.get_link(handler_cls, path, template, page_state,
+                                             description=DESCRIPTION.replace('1-12', '1-13'))
+        self.assertTrue(link)
+        self.assertNotEqual(new_page_state['fingerprint'], page_state['fingerprint'])
+        # Another info-hash is advertised.
+        link = self.get_link(handler_cls, path, template, page_state,
+                             magnet='<a href="magnet:?xt=urn:btih:%s">Magnet</a>' % ('b' * 40))[0]
+        self.assertTrue(link)
+        # Torrent being checked was not confirmed against the page (e.g. an older copy).
+        link = self.get_link(handler_cls, path, template, dict(page_state, hashes=['c' * 40]))[0]
+        self.assertTrue(link)
+
+    def test_rutracker(self):
+        self.check_markers(RutrackerHandler, '/forum/viewtopic.php?t=1', RUTRACKER_PAGE)
+
+    def test_anidub(self):
+        self.check_markers(AnidubHandler, '/details.php?id=1', ANIDUB_PAGE)
+
+    def test_rutor(self):
+        self.check_markers(RutorHandler, '/torrent/1', RUTOR_PAGE)
+
+
+class ConditionalRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.server = FakeServer(self.respond)
+        get_client().configure_limits({'127.0.0.1': {'rate': 100, 'burst': 100}})
+
+    def tearDown(self):
+        self.server.stop()
+
+    def respond(self, path, query):
+        if self.server.headers[-1].get('if-none-match') == '"v1"':
+            return 304, '', {'ETag': '"v1"'}
+        return 200, RUTRACKER_PAGE % {'description': DESCRIPTION, 'views': 1, 'seeders': 1,
+                                      'downloads': 1, 'magnet': ''}, {'ETag': '"v1"'}
+
+    def get_torrent_file(self, torrent_hashes, confirmed_hashes):
+        handler = RutrackerHandler('rutracker.org', {'hash': torrent_hashes[0],
+                                   'comment': self.server.url + '/forum/viewtopic.php?t=1'}, log)
+        handler.torrent_hashes = set(torrent_hashes)
+        handler.set_settings({})
+        handler.set_page_state({'etag': '"v1"', 'hashes': confirmed_hashes})
+        handler.download_torrent = lambda url: 'd4:infod4:name1:xee'
+        return handler.get_torrent_file()
+
+    def test_confirmed(self):
+        self.assertTrue(self.get_torrent_file([TORRENT_HASH], [TORRENT_HASH, 'b' * 40]) is NOT_MODIFIED)
+        self.assertEqual(self.server.headers[-1].get('if-none-match'), '"v1"')
+
+    def test_not_confirmed(self):
+        # An older copy of the torrent is tracked along with the confirmed one.
+        self.assertEqual(self.get_torrent_file([TORRENT_HASH, 'c' * 40], [TORRENT_HASH]), 'd4:infod4:name1:xee')
+        self.assertFalse('if-none-match' in self.server.headers[-1])
+
+    def test_legacy_state(self):
+        # Page state stored without confirmed hashes.
+        self.assertEqual(self.get_torrent_file([TORRENT_HASH], None), 'd4:infod4:name1:xee')
+
+
+class PageFingerprintTest(unittest.TestCase):
+
+    def get_digest(self, page, chunk_size, start='<body>', end='</body>'):
+        fingerprint = PageFingerprint(start, end)
+        for idx in range(0, len(page), chunk_size):
+            fingerprint.feed(page[idx:idx + chunk_size])
+        fingerprint.finish()
+        return fingerprint.get_digest()
+
+    def test_chunks(self):
+        page = '<html><body>\n<p>Release <!-- %s --> 1-12</p>\n</body><p>Views: 5</p></html>' % ('x' * 100)
+        digests = set(self.get_digest(page, chunk_size) for chunk_size in (1, 2, 3, 7, 64, len(page)))
+        self.assertEqual(len(digests), 1)
+        self.assertEqual(self.get_digest(page.replace('Views: 5', 'Views: 6'), 5), digests.pop())
+
+    def test_no_region(self):
+        self.assertEqual(self.get_digest('<html></html>', 4), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
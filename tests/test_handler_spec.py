@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from updatorr.handler_spec import HandlerSpec, HandlerSpecError, load_handler_specs
+from updatorr.utils import get_registered_handlers
+
+
+class HandlerSpecTest(unittest.TestCase):
+
+    def assertBadSpec(self, spec):
+        self.assertRaises(HandlerSpecError, HandlerSpec, spec)
+
+    def test_valid(self):
+        spec = HandlerSpec({'host': 'tracker.test', 'download': r'download\.php\?id={id}', 'concurrency': '3'})
+        self.assertEqual(spec.concurrency, 3)
+        self.assertEqual(spec.get_topic_id('http://tracker.test/viewtopic.php?t=15'), '15')
+
+    def test_missing_fields(self):
+        self.assertBadSpec({'host': 'tracker.test'})
+        self.assertBadSpec({'download': 'x'})
+        self.assertBadSpec('tracker.test')
+
+    def test_bad_patterns(self):
+        self.assertBadSpec({'host': 'tracker.test', 'download': 'x('})
+        self.assertBadSpec({'host': 'tracker.test', 'download': 'x', 'topic_id': '('})
+        self.assertBadSpec({'host': 'tracker.test', 'download': 'x', 'topic_id': r'\d+'})
+
+    def test_bad_values(self):
+        self.assertBadSpec({'host': 'tracker.test', 'download': 'x', 'concurrency': 'four'})
+        self.assertBadSpec({'host': 'tracker.test', 'download': 'x', 'magnet_lookahead': 'far'})
+        self.assertBadSpec({'host': 'tracker.test', 'download': 'x', 'download_method': 'PUT'})
+        self.assertBadSpec({'host': 'tracker.test', 'download': 'x', 'login_fields': {'user': '%(name)s'}})
+
+
+class LoadHandlerSpecsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, filename, contents):
+        filepath = os.path.join(self.tmp_dir, filename)
+        with open(filepath, 'w') as f:
+            f.write(contents)
+        return filepath
+
+    def test_bad_specs_are_skipped(self):
+        filepath = self.write('updatorr_trackers.ini', '\n'.join([
+            '[bad-pattern.test]',
+            'download = (',
+            '[bad-concurrency.test]',
+            'download = dl.php',
+            'concurrency = four',
+            '[good.test]',
+            r'download = dl\.php\?t={id}',
+            'topic_id = t=(\\d+)',
+        ]))
+        self.assertEqual(load_handler_specs(filepath), ['good.test'])
+        self.assertTrue(get_registered_handlers('good.test') is not None)
+        self.assertTrue(get_registered_handlers('bad-pattern.test') is None)
+
+    def test_bad_json(self):
+        self.assertEqual(load_handler_specs(self.write('updatorr_trackers.json', '{"host": ')), [])
+        self.assertEqual(load_handler_specs(self.write('updatorr_trackers.json', '{"host": "a.test"}')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
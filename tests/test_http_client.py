@@ -0,0 +1,153 @@
+import time
+import unittest
+
+from twisted.internet import reactor, threads
+
+from updatorr.http_client import HostLimiter, HTTPClient, BodyStream, RequestTimeout, parse_retry_after
+from tests.support import start_reactor, FakeServer
+
+
+class HostLimiterTest(unittest.TestCase):
+
+    def test_defaults(self):
+        limiter = HostLimiter()
+        for name, value in HostLimiter.DEFAULTS.items():
+            self.assertEqual(getattr(limiter, name), value)
+
+    def test_clamped(self):
+        limiter = HostLimiter(dict((name, 0) for name in HostLimiter.DEFAULTS))
+        for name, value in HostLimiter.MINIMUMS.items():
+            self.assertEqual(getattr(limiter, name), value)
+        limiter = HostLimiter({'rate': -1, 'burst': -5, 'max_retries': -1})
+        self.assertEqual((limiter.rate, limiter.burst, limiter.max_retries), (0.01, 1, 0))
+
+    def test_bad_values(self):
+        limiter = HostLimiter({'rate': 'fast', 'burst': [], 'read_timeout': '15'})
+        self.assertEqual((limiter.rate, limiter.burst, limiter.read_timeout), (1.0, 5, 15))
+
+    def test_zero_rate(self):
+        limiter = HostLimiter({'rate': 0, 'burst': 1})
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertTrue(limiter.acquire() > 0)
+
+    def test_breaker(self):
+        limiter = HostLimiter({'max_failures': 0})
+        limiter.failure()
+        self.assertFalse(limiter.is_open())
+        limiter.failure()
+        self.assertTrue(limiter.is_open())
+
+    def test_suspend(self):
+        limiter = HostLimiter({'breaker_cooldown': 30})
+        limiter.suspend()
+        self.assertTrue(limiter.is_open())
+        self.assertTrue(limiter.open_until <= time.time() + 30)
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after(' 120 '), 120)
+
+    def test_date(self):
+        delay = parse_retry_after(time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 60)))
+        self.assertTrue(55 <= delay <= 60)
+        self.assertEqual(parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT'), 0)
+
+    def test_bad(self):
+        self.assertEqual(parse_retry_after(None), None)
+        self.assertEqual(parse_retry_after('soon'), None)
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.responses = []
+        self.server = FakeServer(lambda path, query: self.responses.pop(0))
+        self.client = HTTPClient()
+        self.client.configure_limits({'127.0.0.1': {'rate': 100, 'burst': 100, 'breaker_cooldown': 5}})
+
+    def tearDown(self):
+        threads.blockingCallFromThread(reactor, self.client.close)
+        self.server.stop()
+
+    def request(self, deadline=None):
+        return threads.blockingCallFromThread(reactor, self.client.request, self.server.url + '/', None, None, None,
+                                              deadline)
+
+    def test_retried(self):
+        self.responses = [(503, '', {'Retry-After': '0'}), (200, 'ok')]
+        self.assertEqual(self.request()[2], 'ok')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_long_delay_opens_breaker(self):
+        self.responses = [(503, '', {'Retry-After': '3600'})]
+        self.assertEqual(self.request()[0], 503)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(self.client.get_limiter(self.server.url).is_open())
+
+    def test_deadline(self):
+        self.responses = [(429, '', {'Retry-After': '2'})]
+        started = time.time()
+        self.assertEqual(self.request(deadline=time.time() + 1)[0], 429)
+        self.assertTrue(time.time() - started < 1)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertFalse(self.client.get_limiter(self.server.url).is_open())
+
+    def test_deadline_passed(self):
+        self.assertRaises(RequestTimeout, self.request, time.time() - 1)
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(self.client.get_limiter(self.server.url).failures, 0)
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.stopped = False
+
+    def stopProducing(self):
+        self.stopped = True
+
+
+class FakeResponse(object):
+
+    def deliverBody(self, protocol):
+        self.protocol = protocol
+        protocol.transport = FakeTransport()
+
+
+class BodyStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.response = FakeResponse()
+
+    def test_read(self):
+        stream = BodyStream(self.response, timeout=5)
+        self.response.protocol.dataReceived('a')
+        self.response.protocol.dataReceived('b')
+        self.response.protocol.connectionLost(None)
+        self.assertEqual(stream.read(), 'ab')
+
+    def test_slow_drip(self):
+        # Every chunk comes in time, but the whole body doesn't.
+        stream = BodyStream(self.response, timeout=0.3)
+        chunks = iter(stream)
+        self.response.protocol.dataReceived('a')
+        self.assertEqual(next(chunks), 'a')
+        time.sleep(0.4)
+        self.response.protocol.dataReceived('b')
+        self.assertRaises(RequestTimeout, next, chunks)
+        time.sleep(0.1)
+        self.assertTrue(self.response.protocol.transport.stopped)
+
+    def test_deadline(self):
+        stream = BodyStream(self.response, timeout=60, deadline=time.time() + 0.2)
+        started = time.time()
+        self.assertRaises(RequestTimeout, stream.read)
+        self.assertTrue(time.time() - started < 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
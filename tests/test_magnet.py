@@ -0,0 +1,64 @@
+import logging
+import unittest
+
+from updatorr.handler_base import NOT_MODIFIED
+from updatorr.http_client import get_client
+from updatorr.tracker_handlers.handler_rutracker import RutrackerHandler
+
+from tests.support import FakeServer, start_reactor
+from tests.test_fingerprint import RUTRACKER_PAGE, DESCRIPTION, TORRENT_HASH
+
+log = logging.getLogger(__name__)
+
+TORRENT_CONTENTS = 'd4:infod4:name1:xee'
+
+
+class MagnetFastPathTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.page = ''
+        self.server = FakeServer(lambda path, query: (200, self.page))
+        get_client().configure_limits({'127.0.0.1': {'rate': 100, 'burst': 100}})
+        self.downloads = []
+        self.logins = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def get_torrent_file(self, magnet):
+        self.page = RUTRACKER_PAGE % {'description': DESCRIPTION, 'views': 1, 'seeders': 1,
+                                      'downloads': 1, 'magnet': magnet}
+        handler = RutrackerHandler('rutracker.org', {'hash': TORRENT_HASH,
+                                   'comment': self.server.url + '/forum/viewtopic.php?t=1'}, log)
+        handler.set_settings({'login': 'user', 'password': 'secret'})
+        handler.login = lambda login, password: self.logins.append(login) or True
+
+        def download_torrent(url):
+            self.downloads.append(url)
+            return TORRENT_CONTENTS
+
+        handler.download_torrent = download_torrent
+        return handler.get_torrent_file()
+
+    def get_magnet(self, info_hash):
+        return '<a href="magnet:?xt=urn:btih:%s&amp;tr=http://bt.example.org/ann">Magnet</a>' % info_hash
+
+    def test_matched(self):
+        self.assertTrue(self.get_torrent_file(self.get_magnet(TORRENT_HASH.upper())) is NOT_MODIFIED)
+        self.assertEqual(self.downloads, [])
+        self.assertEqual(self.logins, [])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_mismatched(self):
+        self.assertEqual(self.get_torrent_file(self.get_magnet('b' * 40)), TORRENT_CONTENTS)
+        self.assertEqual(self.downloads, ['http://dl.rutracker.org/forum/dl.php?t=1'])
+
+    def test_beyond_lookahead(self):
+        filler = 'x' * (RutrackerHandler.magnet_lookahead + 1)
+        self.assertEqual(self.get_torrent_file(filler + self.get_magnet(TORRENT_HASH)), TORRENT_CONTENTS)
+        self.assertEqual(len(self.downloads), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import logging
+import threading
+import unittest
+
+from updatorr.core import Core
+from updatorr.http_client import get_client
+from updatorr.scheduler import UpdatesScheduler
+from updatorr.tracker_handlers.handler_rutracker import RutrackerHandler
+
+from tests.support import FakeServer, start_reactor
+
+log = logging.getLogger(__name__)
+
+HASH_1 = 'A' * 40
+HASH_2 = 'B' * 40
+
+
+def thread_url(topic_id):
+    return 'http://rutracker.org/forum/viewtopic.php?t=%s' % topic_id
+
+
+class RutrackerAPITest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        # topic_id -> info-hash (None for removed threads).
+        self.topics = {'1': HASH_1, '2': HASH_2, '3': None}
+        self.malformed = False
+        # Raw JSON reply replacing the generated one.
+        self.reply = None
+        self.server = FakeServer(self.get_tor_hash)
+        get_client().configure_limits({'127.0.0.1': {'rate': 100, 'burst': 100}})
+
+    def tearDown(self):
+        self.server.stop()
+
+    def get_tor_hash(self, path, query):
+        if path != '/v1/get_tor_hash' or query.get('by') != ['topic_id']:
+            return 404, ''
+        if self.malformed:
+            return 200, '{"result": '
+        if self.reply is not None:
+            return 200, self.reply
+        result = {}
+        for topic_id in query['val'][0].split(','):
+            result[topic_id] = self.topics.get(topic_id)
+        return 200, json.dumps({'result': result})
+
+    def get_handler(self, topic_id=1, torrent_hash=HASH_1.lower()):
+        handler = RutrackerHandler('rutracker.org', {
+            'hash': torrent_hash, 'name': 'Topic %s' % topic_id, 'comment': thread_url(topic_id)}, log)
+        handler.set_settings({'api_url': '%s/v1/get_tor_hash' % self.server.url})
+        return handler
+
+    def test_info_hashes(self):
+        urls = [thread_url(topic_id) for topic_id in (1, 2, 3, 4)]
+        info_hashes = self.get_handler().get_info_hashes(urls)
+        # Removed (null) and unknown threads are left out.
+        self.assertEqual(info_hashes, {urls[0]: HASH_1.lower(), urls[1]: HASH_2.lower()})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_malformed_json(self):
+        self.malformed = True
+        self.assertEqual(self.get_handler().get_info_hashes([thread_url(1)]), None)
+
+    def test_odd_results(self):
+        for reply in ('{"result": null}', '{"result": [1]}', '{"result": {"1": 5}}', '[]'):
+            self.reply = reply
+            self.assertEqual(self.get_handler().get_info_hashes([thread_url(1)]), None)
+
+    def test_no_topics(self):
+        handler = self.get_handler()
+        self.assertEqual(handler.get_info_hashes(['http://rutracker.org/forum/index.php']), {})
+        self.assertEqual(handler.requests_count, 0)
+        self.assertEqual(self.server.requests, [])
+
+    def get_core(self):
+        core = Core.__new__(Core)
+        core.scheduler = UpdatesScheduler(3600)
+        core.stats_lock = threading.Lock()
+        core.saved_requests = 0
+        return core
+
+    def check_info_hashes(self, core, handlers):
+        for handler in handlers:
+            core.scheduler.add(handler.torrent_hash)
+        return core.check_info_hashes([(handler, [handler.torrent_data]) for handler in handlers])
+
+    def test_check_info_hashes(self):
+        core = self.get_core()
+        matched = self.get_handler(1, HASH_1.lower())
+        mismatched = self.get_handler(2, 'c' * 40)
+        removed = self.get_handler(3, 'd' * 40)
+        items_left = self.check_info_hashes(core, [matched, mismatched, removed])
+        self.assertEqual([item[0] for item in items_left], [mismatched, removed])
+        self.assertTrue(core.scheduler.get_last_check(matched.torrent_hash))
+        self.assertFalse(core.scheduler.get_last_check(mismatched.torrent_hash))
+        self.assertFalse(core.scheduler.get_last_check(removed.torrent_hash))
+        # A thread page request saved at the cost of an API request.
+        self.assertEqual(core.saved_requests, 0)
+
+    def test_check_info_hashes_batches(self):
+        for topic_id in range(10, 35):
+            self.topics[str(topic_id)] = '%040x' % topic_id
+        handlers = [self.get_handler(topic_id, '%040x' % topic_id) for topic_id in range(10, 35)]
+        for handler in handlers:
+            handler.info_hashes_batch = 10
+        core = self.get_core()
+        self.assertEqual(self.check_info_hashes(core, handlers), [])
+        self.assertEqual(len(self.server.requests), 3)
+        for request in self.server.requests:
+            self.assertTrue(len(request.split('val=')[1].split(',')) <= 10)
+        self.assertEqual(core.saved_requests, 25 - 3)
+
+    def test_check_info_hashes_failed(self):
+        self.malformed = True
+        core = self.get_core()
+        handlers = [self.get_handler(1), self.get_handler(2, HASH_2.lower())]
+        self.assertEqual([item[0] for item in self.check_info_hashes(core, handlers)], handlers)
+        self.assertEqual(core.saved_requests, -1)
+
+    def test_check_info_hashes_odd_result(self):
+        self.reply = '{"result": {"1": {"hash": "%s"}}}' % HASH_1
+        core = self.get_core()
+        handlers = [self.get_handler(1)]
+        self.assertEqual([item[0] for item in self.check_info_hashes(core, handlers)], handlers)
+
+    def test_check_info_hashes_handler_error(self):
+        core = self.get_core()
+        handlers = [self.get_handler(1), self.get_handler(2, HASH_2.lower())]
+
+        def fail(urls):
+            raise AttributeError('get_info_hashes')
+        handlers[0].get_info_hashes = fail
+        self.assertEqual([item[0] for item in self.check_info_hashes(core, handlers)], handlers)
+
+    def test_check_info_hashes_no_topics(self):
+        core = self.get_core()
+        handler = RutrackerHandler('rutracker.org', {'hash': HASH_1.lower(), 'comment': 'http://rutracker.org/forum/'}, log)
+        self.assertEqual([item[0] for item in self.check_info_hashes(core, [handler])], [handler])
+        self.assertEqual(core.saved_requests, 0)
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
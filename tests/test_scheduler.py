@@ -0,0 +1,55 @@
+import unittest
+
+from updatorr.scheduler import UpdatesScheduler
+
+
+class IntervalsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = UpdatesScheduler(100)
+        self.scheduler.add('t', 1000)
+
+    def check(self, updated, now=1000):
+        self.scheduler.pop_due(now=now)
+        self.scheduler.checked('t', updated, now=now)
+        item = self.scheduler.state['t']
+        self.assertEqual(item['next_check'], now + item['interval'])
+        return item['interval']
+
+    def test_updated(self):
+        # Interval is halved down to a quarter of walk period.
+        self.assertEqual([self.check(True) for idx in range(4)], [50, 25, 25, 25])
+        self.assertEqual(self.scheduler.state['t']['last_update'], 1000)
+
+    def test_unchanged(self):
+        # Interval is doubled up to four walk periods.
+        self.assertEqual([self.check(False) for idx in range(4)], [200, 400, 400, 400])
+        self.assertEqual(self.check(True), 200)
+
+    def test_failed(self):
+        self.assertEqual(self.check(None), 100)
+        self.assertEqual(self.scheduler.state['t']['last_check'], 1000)
+
+    def test_base_interval(self):
+        self.check(False)
+        self.scheduler.base_interval = 1000
+        # Intervals are clamped to the bounds of the current walk period.
+        self.assertEqual(self.check(True), 250)
+
+
+class CountCycleTest(unittest.TestCase):
+
+    def test_count_cycle(self):
+        scheduler = UpdatesScheduler(100)
+        for idx, next_check in enumerate([1000, 1010, 1050, 1150, 1500]):
+            scheduler.add('t%s' % idx, next_check)
+        self.assertEqual(scheduler.count_cycle(1000, 1100), (0, 3))
+        self.assertEqual(scheduler.pop_due(now=1020), ['t0', 't1'])
+        scheduler.checked('t0', False, now=1020)
+        # Pending torrent is still due, and the checked one is not due again.
+        self.assertEqual(scheduler.count_cycle(1000, 1100), (1, 2))
+        self.assertEqual(scheduler.count_cycle(1100, 1200), (0, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import time
+import hashlib
+import tempfile
+import logging
+import threading
+import unittest
+
+from updatorr.utils import ResourceIndex, WorkerPool, bdecode, get_info_hash, get_torrent_files, is_torrent_filepath
+from updatorr.tracker_handlers.handler_rutracker import RutrackerHandler
+
+try:
+    from deluge._libtorrent import lt
+except ImportError:
+    lt = None
+
+from tests.bencode import bencode, make_torrent
+
+
+class InfoHashTest(unittest.TestCase):
+
+    def test_multi_file(self):
+        for files_count in (1, 7, 500):
+            contents, info = make_torrent(files_count)
+            self.assertEqual(get_info_hash(contents), hashlib.sha1(bencode(info)).hexdigest())
+
+    def test_info_position(self):
+        # Keys around `info` (including ones `info` is a prefix of) are skipped.
+        contents, info = make_torrent(3, **{
+            'info-x': {'info': 'fake'},
+            'infos': ['info', 4],
+            'url-list': ['http://mirror.test/%s' % idx for idx in range(3)],
+        })
+        self.assertEqual(get_info_hash(contents), hashlib.sha1(bencode(info)).hexdigest())
+
+    def test_raw_bytes(self):
+        # Info dictionary is hashed as is, even if its keys are not sorted.
+        info = 'd4:name1:b12:piece lengthi16384e6:lengthi1e6:pieces20:%se' % ('x' * 20)
+        contents = 'd8:announce4:http4:info%se' % info
+        self.assertEqual(get_info_hash(contents), hashlib.sha1(info).hexdigest())
+
+    def test_bad_contents(self):
+        for contents in ('<html></html>', '', 'd8:announce4:httpe', 'd4:info', 'd4:infod4:name',
+                         'd4:infoi1ee', 'd4:infod4:name99:xee', 'd4:infod4:name-3:xee', 'd4:infod:xee'):
+            self.assertRaises(ValueError, get_info_hash, contents)
+
+    def test_torrent_filepath(self):
+        fd, filepath = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.assertTrue(is_torrent_filepath(filepath))
+        finally:
+            os.remove(filepath)
+        self.assertFalse(is_torrent_filepath(filepath))
+        self.assertFalse(is_torrent_filepath(make_torrent(1)[0]))
+        self.assertFalse(is_torrent_filepath('d4:info\0'))
+
+    @unittest.skipIf(lt is None, 'libtorrent is not available')
+    def test_libtorrent(self):
+        contents = make_torrent(300)[0]
+        torrent_info = lt.torrent_info(lt.bdecode(contents))
+        self.assertEqual(get_info_hash(contents), str(torrent_info.info_hash()))
+
+    @unittest.skipIf(lt is None, 'libtorrent is not available')
+    def test_libtorrent_created(self):
+        # Torrent made by libtorrent itself, with its own keys order and extensions.
+        storage = lt.file_storage()
+        for idx in range(50):
+            storage.add_file('Release/CD%s/track %02d.flac' % (idx // 10, idx), 100000 + idx)
+        creator = lt.create_torrent(storage, 16384)
+        creator.set_comment('http://tracker.test/forum/viewtopic.php?t=1')
+        creator.add_tracker('http://bt.tracker.test/ann')
+        for piece in range(creator.num_pieces()):
+            creator.set_hash(piece, '\x01' * 20)
+        contents = lt.bencode(creator.generate())
+        self.assertEqual(get_info_hash(contents), str(lt.torrent_info(lt.bdecode(contents)).info_hash()))
+
+
+class TorrentFilesTest(unittest.TestCase):
+
+    def test_bdecode(self):
+        value = {'a': [1, -2, 'xyz', {'b': ''}], 'c': 'd'}
+        self.assertEqual(bdecode(bencode(value)), value)
+        for contents in ('', 'i1', 'l', '3:ab', '-1:a', 'd1:ae', 'i1ei2e', '<html>'):
+            self.assertRaises(ValueError, bdecode, contents)
+
+    def test_multi_file(self):
+        contents = make_torrent(3)[0]
+        self.assertEqual(get_torrent_files(contents), [
+            os.path.join('Synthetic torrent', 'dir %s' % idx, 'file %s.bin' % idx) for idx in range(3)])
+
+    def test_single_file(self):
+        info = {'name': 'file.bin', 'name.utf-8': 'f\xc3\xafle.bin', 'length': 1, 'piece length': 16384, 'pieces': 'x' * 20}
+        self.assertEqual(get_torrent_files(bencode({'info': info})), [u'f\xefle.bin'])
+
+    @unittest.skipIf(lt is None, 'libtorrent is not available')
+    def test_libtorrent(self):
+        contents = make_torrent(30)[0]
+        lt_files = [a_file.path.decode('utf-8') for a_file in lt.torrent_info(lt.bdecode(contents)).files()]
+        self.assertEqual(get_torrent_files(contents), lt_files)
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peaks = {}
+        self.done = []
+
+    def process(self, item):
+        group = item[0]
+        with self.lock:
+            self.running[group] = self.running.get(group, 0) + 1
+            self.peaks[group] = max(self.peaks.get(group, 0), self.running[group])
+            self.peaks['all'] = max(self.peaks.get('all', 0), sum(self.running.values()))
+        time.sleep(0.05)
+        with self.lock:
+            self.running[group] -= 1
+            self.done.append(item)
+
+    def test_group_limits(self):
+        # Items of a group at its limit do not hold threads other groups could use.
+        items = ['b%s' % idx for idx in range(6)] + ['a%s' % idx for idx in range(8)] + ['c0']
+        pool = WorkerPool(6, {'a': 4, 'b': 1})
+        self.assertEqual(pool.map(self.process, items, lambda item: item[0]), [])
+        self.assertEqual(sorted(self.done), sorted(items))
+        self.assertEqual(self.peaks['a'], 4)
+        self.assertEqual(self.peaks['b'], 1)
+        self.assertEqual(self.peaks['c'], 1)
+        self.assertEqual(self.peaks['all'], 6)
+
+    def test_deadline(self):
+        items = ['a%s' % idx for idx in range(6)]
+        skipped = WorkerPool(2).map(self.process, items, lambda item: item[0], time.time() + 0.12)
+        self.assertEqual(sorted(self.done + skipped), sorted(items))
+        self.assertTrue(skipped)
+        self.assertEqual(self.peaks['all'], 1)
+
+
+class ResourceIndexTest(unittest.TestCase):
+
+    def test_grouping(self):
+        index = ResourceIndex()
+        comments = {
+            '1': 'Release http://rutracker.org/forum/viewtopic.php?t=5&start=30',
+            '2': 'http://RuTracker.org:80/forum/viewtopic.php?start=30&t=5#p1',
+            '3': 'http://rutracker.org/forum/viewtopic.php?start=30&t=5&',
+            '4': 'http://rutracker.org/forum/viewtopic.php?t=6&start=30',
+        }
+        for torrent_id, comment in comments.items():
+            index.add(torrent_id, comment)
+        self.assertEqual(len(set(index.get(torrent_id)[0] for torrent_id in '123')), 1)
+        self.assertNotEqual(index.get('1')[0], index.get('4')[0])
+        self.assertEqual(index.get('1')[1:], ('rutracker.org', RutrackerHandler))
+        # Thread identifier doesn't depend on query parameters order.
+        for torrent_id, topic_id in (('1', '5'), ('2', '5'), ('4', '6')):
+            handler = index.get_tracker_handler({'hash': torrent_id, 'comment': index.get(torrent_id)[0]},
+                                                logging.getLogger(__name__))
+            self.assertEqual(handler.get_id_from_link(), topic_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
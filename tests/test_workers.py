@@ -0,0 +1,47 @@
+import unittest
+
+from updatorr import workers
+from updatorr.handler_base import LinkScanner
+from updatorr.utils import get_info_hash
+
+from tests.bencode import make_torrent
+
+
+class UnusedPool(object):
+
+    def apply(self, func, args):
+        raise AssertionError('%s is run in a worker process' % func.__name__)
+
+
+class WorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        workers.start_pool(1)
+
+    def tearDown(self):
+        workers.stop_pool()
+
+    def test_summarize_torrent(self):
+        contents = make_torrent(5)[0]
+        info_hash = get_info_hash(contents)
+        self.assertEqual(workers.run(workers.summarize_torrent, contents, [info_hash]), {'hash': info_hash})
+        summary = workers.run(workers.summarize_torrent, contents, [info_hash, 'a' * 40])
+        self.assertEqual(summary, workers.summarize_torrent(contents, [info_hash, 'a' * 40]))
+        self.assertEqual(len(summary['files']), 5)
+
+    def test_bad_torrent(self):
+        self.assertRaises(ValueError, workers.run, workers.summarize_torrent, '<html></html>', [])
+
+    def test_link_scanner(self):
+        # Chunks are scanned in-thread even if the pool is started.
+        pool, workers._pool = workers._pool, UnusedPool()
+        try:
+            scanner = LinkScanner()
+            page = '<a href="http://a.test/1">1</a> <a href="http://a.test/2">2</a>'
+            links = scanner.feed(page[:30]) + scanner.feed(page[30:])
+        finally:
+            workers._pool = pool
+        self.assertEqual(links, ['http://a.test/1', 'http://a.test/2'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,19 +4,29 @@ import threading
 import base64
 import pkgutil
 import time
-import re
+import math
+
+from collections import OrderedDict
 
 import deluge.configmanager
 import deluge.component as component
-from deluge.common import is_url
 from deluge.event import DelugeEvent
 from deluge.core.rpcserver import export
 from deluge.plugins.pluginbase import CorePluginBase
+from twisted.internet import reactor, threads
 from twisted.internet.task import LoopingCall
 
 # Line below is required to import tracker handler on fly.
 import updatorr.tracker_handlers
 from updatorr.utils import *
+from updatorr.http_client import get_client, HostLimiter
+from updatorr.handler_base import NOT_MODIFIED
+from updatorr.page_cache import PageCache
+from updatorr.sessions import SESSIONS
+from updatorr.feeds import FeedIndex
+from updatorr.workers import run, start_pool, stop_pool, summarize_torrent
+from updatorr.scheduler import UpdatesScheduler
+from updatorr.handler_spec import load_handler_specs
 import sys
 import traceback
 
@@ -34,12 +44,18 @@ for mloader, pname, ispkg in pkgutil.iter_modules(updatorr.tracker_handlers.__pa
 DEFAULT_PREFS = {
     'last_walk': 0,
     'walk_period': 24,
+    'walk_concurrency': 1,  # Global cap for torrents checked simultaneously.
+    'walk_time_budget': 0,  # Maximum walk duration in seconds (requests in flight are cut off), 0 for no limit.
+    'trickle': False,  # Spread checks evenly across walk period instead of bursts.
+    'use_process_pool': False,  # Run CPU-bound parts of checks in worker processes.
+    'store_tmp_torrents': False,  # Debug mode: downloaded .torrent files are kept in temp dir.
     'trackers_settings': {},
-    'torrents_to_update': []  # That might have been set(), except config serialization.
+    'torrents_to_update': [],  # Loaded into TorrentsRegistry, since config serializes lists only.
+    'schedule': {}  # Per-torrent checks schedule state, see UpdatesScheduler.
 }
 
-# This regex is used to get hyperlink from torrent comment.
-RE_LINK = re.compile(r'(?P<url>https?://[^\s]+)')
+# Files with declarative tracker handlers specifications within Deluge config dir.
+HANDLER_SPECS_FILES = ('updatorr_trackers.json', 'updatorr_trackers.ini')
 
 
 class UpdatorrUpdateDoneEvent(DelugeEvent):
@@ -60,8 +76,12 @@ class UpdatorrUpdatesCheckStartedEvent(DelugeEvent):
 
 
 class UpdatorrUpdatesCheckFinishedEvent(DelugeEvent):
-    """This event fires up when torrent updates check is finished."""
-    pass
+    """This event fires up when torrent updates check is finished.
+    `partial` is True if the check was interrupted by walk time budget.
+    `saved_requests` is a number of requests saved by checking torrents at once
+    (torrents sharing thread pages, tracker feeds, batch info-hashes lookups)."""
+    def __init__(self, partial=False, saved_requests=0):
+        self._args = [partial, saved_requests]
 
 
 class Core(CorePluginBase):
@@ -69,6 +89,21 @@ class Core(CorePluginBase):
     walking = False
     plugin_id = 'Updatorr'
 
+    # Config file is rewritten at most once per this number of seconds.
+    SAVE_DELAY = 5
+    # Seconds between walker timer ticks.
+    WALK_TICK = 60
+    # Fraction of check interval next checks are randomly shifted by in trickle mode.
+    TRICKLE_JITTER = 0.1
+    # Number of torrents statuses got within a single reactor call during walks.
+    STATUS_BATCH = 20
+    # Seconds between reactor lag meter ticks.
+    LAG_TICK = 1
+    config_dirty = False
+    _save_call = None
+    # Time trickle mode was turned on at (trickle cycles are counted from).
+    trickle_start = None
+
     def enable(self):
         """This one fires when plugin is enabled."""
         self.plugin = component.get('CorePluginManager')
@@ -78,32 +113,100 @@ class Core(CorePluginBase):
         self.torrents = self.core.torrentmanager.torrents
 
         self.config = deluge.configmanager.ConfigManager('updatorr.conf', DEFAULT_PREFS)
-        self.torrents_to_update = self.config['torrents_to_update']
+        self.torrents_to_update = TorrentsRegistry(self.config['torrents_to_update'])
         self.walk_period = self.config['walk_period']
+        self.walk_concurrency = self.config['walk_concurrency']
+        self.trickle = self.config['trickle']
+        self.walk_time_budget = self.config['walk_time_budget']
+        self.use_process_pool = self.config['use_process_pool']
         self.last_walk = self.config['last_walk']
         self.trackers_settings = self.config['trackers_settings']
 
+        # Worker processes are forked before the plugin starts its own threads.
+        self.configure_process_pool()
+
+        for filename in HANDLER_SPECS_FILES:
+            hosts = load_handler_specs(deluge.configmanager.get_config_dir(filename))
+            if hosts:
+                log.info('Updatorr Loaded tracker handlers from %s: %s' % (filename, ', '.join(hosts)))
+
         self.update_trackers_settings()
 
+        # Forum thread URLs and tracker handlers of torrents, kept current with torrents events.
+        self.resource_index = ResourceIndex()
+        for torrent_id in self.torrents.keys():
+            self.index_torrent(torrent_id)
+        self.event_manager = component.get('EventManager')
+        self.event_manager.register_event_handler('TorrentAddedEvent', self.on_torrent_added_event)
+        self.event_manager.register_event_handler('TorrentRemovedEvent', self.on_torrent_removed_event)
+
+        self.scheduler = UpdatesScheduler(self.get_walk_period_seconds(), self.config['schedule'])
+        for torrent_id in self.torrents_to_update:
+            # Torrents not scheduled yet keep the cadence of the previous global walks.
+            self.scheduler.add(torrent_id, int(self.last_walk) + self.get_walk_period_seconds())
+        self.configure_trickle()
+
+        # Thread pages state (e.g. HTTP validators) from previous checks.
+        self.page_cache = PageCache()
+        # Tracker feeds items by forum thread identifier.
+        self.feed_index = FeedIndex()
+
+        # Guards a number of requests saved within a walk by checking torrents at once.
+        self.stats_lock = threading.Lock()
+        self.saved_requests = 0
+
         self.filter_manager = component.get('FilterManager')
         self.filter_manager.register_tree_field(self.plugin_id, self.get_filters_initial)
 
+        self.prewarm_sessions()
+
         # We will check whether it's time to go for updates every 60 seconds.
         self.walk_torrents_timer = LoopingCall(self.run_walker)
-        self.walk_torrents_timer.start(60)
+        self.walk_torrents_timer.start(self.WALK_TICK)
+
+        # Measures how walks affect reactor responsiveness (RPC latency).
+        self.lag_meter = LagMeter(self.LAG_TICK)
+        self.lag_timer = LoopingCall(self.lag_meter.tick)
+        self.lag_timer.start(self.LAG_TICK, now=False)
 
 
     def disable(self):
         """That one fires when plugin is disabled."""
+        if self._save_call is not None and self._save_call.active():
+            self._save_call.cancel()
+        self._save_call = None
         self.walk_torrents_timer.stop()
+        self.event_manager.deregister_event_handler('TorrentAddedEvent', self.on_torrent_added_event)
+        self.event_manager.deregister_event_handler('TorrentRemovedEvent', self.on_torrent_removed_event)
+        self.lag_timer.stop()
+        self.lag_meter.reset()
         self.filter_manager.deregister_tree_field(self.plugin_id)
         self.plugin.deregister_status_field(self.plugin_id)
         self.save_config()
+        self.page_cache.save()
+        get_client().close()
+        stop_pool()
 
     def update(self):
         """This one fires every second while plugin is enabled."""
         pass
 
+    def index_torrent(self, torrent_id):
+        """Puts torrent forum thread URL from its comment into resources index."""
+        try:
+            comment = self.core.get_torrent_status(torrent_id, ['comment'])['comment']
+        except KeyError:
+            return
+        self.resource_index.add(torrent_id, comment)
+
+    def on_torrent_added_event(self, torrent_id, *args):
+        """Triggers when a torrent is added into Deluge session."""
+        self.index_torrent(torrent_id)
+
+    def on_torrent_removed_event(self, torrent_id):
+        """Triggers when a torrent is removed from Deluge session."""
+        self.resource_index.discard(torrent_id)
+
     UPDATE_STATES = {True: 'On', False: 'Off'}
 
     def get_status_label(self, torrent_id):
@@ -123,26 +226,126 @@ class Core(CorePluginBase):
                     'login_required': handler.login_required,
                     'login': '',
                     'password': '',
-                    'cookies': None
+                    'cookies': None,
+                    'concurrency': handler.concurrency
                 }
                 self.trackers_settings[domain] = domain_dict
             else:
                 self.trackers_settings[domain].update({'login_required': handler.login_required})
+                self.trackers_settings[domain].setdefault('concurrency', handler.concurrency)
+            for name, default in HostLimiter.DEFAULTS.items():
+                self.trackers_settings[domain].setdefault(name, default)
+        get_client().configure_limits(self.trackers_settings)
+
+    def get_walk_period_seconds(self):
+        """Returns base updates check interval in seconds."""
+        return int(self.walk_period) * 3600
+
+    def configure_trickle(self):
+        """Applies trickle mode settings to scheduler.
+        In trickle mode torrents already due are spread across walk period,
+        and next checks times are jittered.
+
+        """
+        if self.trickle:
+            if self.trickle_start is None:
+                self.trickle_start = time.time()
+            self.scheduler.jitter = self.TRICKLE_JITTER
+            self.scheduler.spread_due(self.get_walk_period_seconds())
+        else:
+            self.trickle_start = None
+            self.scheduler.jitter = 0
+
+    def configure_process_pool(self):
+        """Starts or stops worker processes pool used for CPU-bound
+        parts of torrents checks (links scanning, torrents decoding,
+        new torrents preferences) according to settings.
+
+        """
+        if self.use_process_pool:
+            start_pool()
+        else:
+            stop_pool()
+
+    def get_trickle_slice(self):
+        """Returns a maximum number of torrents to be checked
+        on a single walker timer tick in trickle mode.
+
+        """
+        ticks = max(1, self.get_walk_period_seconds() / self.WALK_TICK)
+        return int(math.ceil(len(self.torrents_to_update) / float(ticks))) or 1
+
+    def get_trickle_progress(self, now=None):
+        """Returns a fraction of torrents checked within the current
+        trickle cycle (walk period window counted from trickle mode start)
+        out of those checked and those due before the cycle end.
+        None is returned if trickle mode is off.
+
+        """
+        if not self.trickle or self.trickle_start is None:
+            return None
+        if now is None:
+            now = time.time()
+        period = self.get_walk_period_seconds()
+        cycle_start = now - (now - self.trickle_start) % period
+        checked, due = self.scheduler.count_cycle(cycle_start, cycle_start + period)
+        if not checked + due:
+            return 1.0
+        return checked / float(checked + due)
+
+    def prewarm_sessions(self):
+        """Logs in to trackers with credentials set in background,
+        so that checks start with authenticated sessions.
+
+        """
+        for domain, settings in self.trackers_settings.items():
+            if not settings.get('login_required') or not settings.get('login'):
+                continue
+            handler = get_tracker_handler({'comment': domain}, log)
+            if handler is None or not hasattr(handler, 'prepare_session'):
+                continue
+            handler.set_settings(settings)
+            deferred = threads.deferToThread(handler.prepare_session)
+            deferred.addErrback(
+                lambda failure: log.warning('Updatorr session prewarm failed: %s' % failure.getErrorMessage()))
+            deferred.addBoth(self.on_session_prewarmed, domain)
+
+    def on_session_prewarmed(self, result, domain):
+        """Persists cookies got by tracker session prewarm."""
+        if self.persist_cookies(domain):
+            self.mark_config_dirty()
 
     @export
     def get_status(self):
         """Returns tuple with Updatorr status data:
-        last walk time, walk period in hours, is currently walking."""
-        return self.last_walk, self.walk_period, self.walking
+        last walk time, walk period in hours, is currently walking,
+        next scheduled check time (None if nothing is scheduled),
+        trickle cycle progress from 0 to 1 (None if trickle mode is off)."""
+        return (self.last_walk, self.walk_period, self.walking, self.scheduler.get_next_check(),
+                self.get_trickle_progress())
+
+    @export
+    def get_reactor_lag(self):
+        """Returns a dictionary with reactor lag statistics for the last
+        minute: last, max and avg lag in seconds."""
+        return self.lag_meter.get_stats()
+
+    @export
+    def get_schedule(self):
+        """Returns a dictionary with per-torrent checks schedule:
+        torrent ID -> {interval, next_check, last_check, last_update},
+        where interval is in seconds."""
+        return self.scheduler.get_state()
 
     @export
     def test_login(self, domain, login, password):
         """Launches login procedure for tracker domain.
-        Returns True on success, overwise - False."""
+        Returns a Deferred firing with True on success, overwise - False."""
         handler = get_tracker_handler({'comment': domain}, log)
-        handler.set_settings(self.trackers_settings.get(domain))
         if handler is not None:
-            return handler.login(login=login, password=password)
+            handler.set_settings(self.trackers_settings.get(domain))
+            # Handlers are synchronous, so keep them off the reactor thread.
+            return threads.deferToThread(handler.login, login=login, password=password)
         return None
 
     @export
@@ -154,19 +357,39 @@ class Core(CorePluginBase):
     @export
     def run_walker(self, force=False):
         """Runs update process in a separate thread
-        if it is a hight time for it and it's not already started."""
-        if not force:
-            now = time.time()
-            next_walk = int(self.last_walk) + (int(self.walk_period) * 3600)
-            log.debug('Updatorr run walker: walking=%s; next_walk=%s; now=%s' % (self.walking, next_walk, now))
-            if self.walking:
-                return False
-            if next_walk > now:
+        if it is a hight time for it and it's not already started.
+
+        If `force` is False only torrents due by schedule are checked.
+        In trickle mode those are limited to a slice for a single timer tick.
+
+        """
+        if self.walking:
+            log.debug('Updatorr run walker: already walking')
+            return False
+        quiet = False
+        cycle = False
+        if force:
+            torrents_list = None
+        else:
+            limit = None
+            if self.trickle:
+                limit = self.get_trickle_slice()
+            torrents_list = self.scheduler.pop_due(limit=limit)
+            log.debug('Updatorr run walker: %s torrent(s) due' % len(torrents_list))
+            if not torrents_list:
                 return False
-        threading.Thread(target=self.walk, kwargs={'force': force}).start()
+            # Adaptive intervals make due torrents drift apart, so scheduled walks
+            # are notified of (and remembered) once per walk period at most.
+            cycle = time.time() - self.last_walk >= self.get_walk_period_seconds()
+            # Checks spread across walk period are not worth notifications.
+            quiet = self.trickle or not cycle
+        # To prevent possible concurent runs.
+        self.walking = True
+        threading.Thread(target=self.walk, kwargs={
+            'force': force, 'torrents_list': torrents_list, 'quiet': quiet, 'cycle': cycle}).start()
         return True
 
-    def walk(self, force=False):
+    def walk(self, force=False, torrents_list=None, quiet=False, cycle=False):
         """Implemets automatic torrent updates process.
         Automatic update is available for torrents selected by user
         and having tracker's page URL in torrent's `comment` field.
@@ -176,8 +399,16 @@ class Core(CorePluginBase):
 
         If `force` set to a list of torrent IDs, only those
         torrents will be checked for updates.
-        If `force` is False every torrent scheduled to updates
-        by used will be checked.
+        If `force` is True every torrent scheduled to updates
+        by user will be checked.
+        If `force` is False torrents from `torrents_list` (due by schedule)
+        will be checked.
+
+        If `quiet` is True updates check started and finished
+        events are not fired.
+
+        If `cycle` is True the walk starts a new walk period,
+        so its time is remembered as the last walk time.
 
         """
 
@@ -185,94 +416,380 @@ class Core(CorePluginBase):
         self.walking = True
         try:
             log.info('Updatorr walking...')
-            component.get('EventManager').emit(UpdatorrUpdatesCheckStartedEvent())
-    
+            deadline = None
+            if self.walk_time_budget:
+                deadline = time.time() + int(self.walk_time_budget)
+            if not quiet:
+                self.emit_event(UpdatorrUpdatesCheckStartedEvent())
+
             allow_last_walk_update = False
-    
+
             if isinstance(force, list):
                 torrents_list = force
-            else:
-                torrents_list = self.torrents_to_update
-    
+            elif force or torrents_list is None:
+                torrents_list = self.torrents_to_update.to_list()
+
+            # Torrents without URL in comment are excluded up front.
+            indexed_list = []
             for torrent_id in torrents_list:
-                try:
-                    torrent_data = self.core.get_torrent_status(torrent_id, [])
-                    log.info('Updatorr Processing %s ...' % torrent_data['name'])
-                except KeyError:
+                if torrent_id in self.resource_index:
+                    indexed_list.append(torrent_id)
+                else:
+                    log.info('Updatorr \tSKIPPED No URL found in comment of torrent %s (or it is not listed)' % torrent_id)
+
+            # Torrents sharing a thread page are checked at once.
+            groups = OrderedDict()
+            statuses = self.get_torrents_statuses(indexed_list)
+            for torrent_id in indexed_list:
+                torrent_data = statuses.get(torrent_id)
+                resource = self.resource_index.get(torrent_id)
+                # Deluge returns an empty status for unknown torrents.
+                if not torrent_data or resource is None:
                     log.debug('Updatorr \tSKIPPED No torrent with id %s listed [yet]' % torrent_id)
                     continue
-                # Remove not url data from comment
-                torrent_data['comment'] = RE_LINK.search(torrent_data['comment']).group('url')
-                if not is_url(torrent_data['comment']):
-                    log.info('Updatorr \tSKIPPED No URL found in torrent comment')
-                    continue
+                log.info('Updatorr Processing %s ...' % torrent_data['name'])
+                # Normalized URL from torrent comment.
+                torrent_data['comment'] = resource[0]
                 # From now on we consider that update took its place.
                 # If only this update is not forced.
-                if not force:
+                if cycle:
                     allow_last_walk_update = True
-                tracker_handler = get_tracker_handler(torrent_data, log)
+                groups.setdefault(torrent_data['comment'], []).append(torrent_data)
+
+            items = []
+            for torrents in groups.values():
+                tracker_handler = self.resource_index.get_tracker_handler(torrents[0], log)
                 if tracker_handler is None:
-                    self.dump_error(torrent_id, 'Unable to find tracker handler for %s' % torrent_data['comment'])
+                    for torrent_data in torrents:
+                        self.dump_error(torrent_data['hash'], 'Unable to find tracker handler for %s' % torrent_data['comment'])
                     continue
+                tracker_handler.torrent_hashes = set(torrent_data['hash'] for torrent_data in torrents)
                 tracker_handler.set_settings(self.trackers_settings.get(tracker_handler.tracker_host))
-                new_torrent_filepath = tracker_handler.get_torrent_file()
-                if new_torrent_filepath is None:
-                    self.dump_error(torrent_id, 'Error in tracker handling: %s' % tracker_handler.get_error_text())
-                    continue
-    
-                # Let's store cookies form that tracker to enter without logins in future sessions.
-                self.trackers_settings[tracker_handler.tracker_host]['cookies'] = tracker_handler.get_cookies(as_dict=True)
-    
-                new_torrent_contents = read_torrent_file(new_torrent_filepath)
-                new_torrent_info = read_torrent_info(new_torrent_contents)
-                if torrent_data['hash'] == new_torrent_info['hash']:
-                    log.info('Updatorr \tSKIPPED Torrent is up-to-date')
-                    continue
-                log.info('Updatorr \tTorrent update is available')
-    
-                new_torrent_prefs = get_new_prefs(torrent_data, new_torrent_info)
-                added_torrent_id = self.core.add_torrent_file(None, base64.encodestring(new_torrent_contents), new_torrent_prefs)
-    
-                if added_torrent_id is not None:
-                    self.core.remove_torrent(torrent_id, False)
-                    log.info('Updatorr \tTorrent is updated')
-                    # Fire up update finished event.
-                    component.get('EventManager').emit(UpdatorrUpdateDoneEvent(new_torrent_info['hash']))
-                    # Add new torrent hash to continue autoupdates.
-                    self.set_items_to_update(new_torrent_info['hash'], True)
-                    # Remove old torrent from autoupdates list.
-                    self.set_items_to_update(torrent_id, False)
-                else:
-                    self.dump_error(torrent_id, 'Unable to replace current torrent with a new one')
-    
-                # No littering, remove temporary .torrent file.
-                os.remove(new_torrent_filepath)
-    
+                tracker_handler.set_page_state(self.page_cache.get(tracker_handler.resource_url))
+                tracker_handler.deadline = deadline
+                items.append((tracker_handler, torrents))
+
+            host_limits = {}
+            for domain, settings in self.trackers_settings.items():
+                host_limits[domain] = settings.get('concurrency', 1)
+
+            self.saved_requests = 0
+            # Torrents confirmed up-to-date in bulk are not checked one by one.
+            items = self.check_feeds(items)
+            items = self.check_info_hashes(items, deadline)
+
+            pool = WorkerPool(self.walk_concurrency, host_limits)
+            skipped = pool.map(self.check_torrents, items, lambda item: item[0].tracker_host, deadline)
+            partial = bool(skipped)
+            if partial:
+                log.warning('Updatorr walk time budget is exceeded, %s thread page(s) left for the next run' % len(skipped))
+                for tracker_handler, torrents in skipped:
+                    for torrent_data in torrents:
+                        self.scheduler.requeue(torrent_data['hash'])
+            self.page_cache.save()
+
             if allow_last_walk_update:
                 # Remember lastrun time.
                 self.last_walk = time.time()
-    
-            log.info('Updatorr walk is finished')
-            component.get('EventManager').emit(UpdatorrUpdatesCheckFinishedEvent())
+            # Checkpoint.
+            self.mark_config_dirty()
+
+            log.info('Updatorr walk is finished, %s request(s) saved, reactor lag is %.3fs at most' % (
+                self.saved_requests, self.lag_meter.get_stats()['max']))
+            if not quiet or partial:
+                self.emit_event(UpdatorrUpdatesCheckFinishedEvent(partial, self.saved_requests))
         except:
-            log.error(traceback.format_exc())    
-        finally:    
+            log.error(traceback.format_exc())
+        finally:
+            # Torrents skipped for any reason are rescheduled as they were.
+            self.scheduler.reschedule_pending()
             self.walking = False
 
+    def check_feeds(self, items):
+        """Confirms torrents up-to-date if tracker feeds do not list
+        their forum threads as updated since their last checks
+        (see `FeedIndex`).
+
+        `items` is a list of tuples (tracker handler, list of torrents data).
+        Returns a list of items left to be checked one by one.
+
+        """
+        items_left = []
+        indexed_hosts = {}
+        for tracker_handler, torrents in items:
+            host = tracker_handler.tracker_host
+            if host not in indexed_hosts:
+                fetched = self.feed_index.get_fetched(host)
+                indexed_hosts[host] = self.feed_index.update(tracker_handler)
+                if indexed_hosts[host] and self.feed_index.get_fetched(host) != fetched:
+                    self.count_saved_requests(-len(tracker_handler.get_feed_urls()))
+            if not indexed_hosts[host]:
+                items_left.append((tracker_handler, torrents))
+                continue
+
+            topic_id = tracker_handler.get_topic_id(tracker_handler.resource_url)
+            last_check = min(self.scheduler.get_last_check(torrent_data['hash']) for torrent_data in torrents)
+            if self.feed_index.is_updated(host, topic_id, last_check) is not False:
+                # Either updated or feeds do not reach back to the last check.
+                items_left.append((tracker_handler, torrents))
+                continue
+
+            self.count_saved_requests(len(torrents))
+            for torrent_data in torrents:
+                log.info('Updatorr \tSKIPPED Torrent %s is up-to-date (according to tracker feeds)' % torrent_data['name'])
+                # Updates made since feeds were fetched are to be caught on the next check.
+                self.scheduler.checked(torrent_data['hash'], False, now=self.feed_index.get_fetched(host))
+        return items_left
+
+    def check_info_hashes(self, items, deadline=None):
+        """Confirms torrents up-to-date in bulk using tracker handlers
+        supporting batch info-hashes lookups (see `get_info_hashes()`).
+
+        `items` is a list of tuples (tracker handler, list of torrents data).
+        Returns a list of items left to be checked one by one.
+
+        """
+        items_by_host = OrderedDict()
+        for item in items:
+            items_by_host.setdefault(item[0].tracker_host, []).append(item)
+
+        items_left = []
+        for host, host_items in items_by_host.items():
+            tracker_handler = host_items[0][0]
+            batch = tracker_handler.info_hashes_batch
+            for idx in range(0, len(host_items), batch):
+                info_hashes = None
+                if (deadline is None or time.time() < deadline) and \
+                        not get_client().get_limiter(tracker_handler.resource_url).is_open():
+                    chunk = host_items[idx:idx + batch]
+                    requests_count = tracker_handler.requests_count
+                    try:
+                        info_hashes = tracker_handler.get_info_hashes([handler.resource_url for handler, torrents in chunk])
+                    except Exception:
+                        log.exception('Updatorr info-hashes lookup failed on %s' % host)
+                    # Lookup requests are charged whether they succeed or not.
+                    self.count_saved_requests(requests_count - tracker_handler.requests_count)
+                if info_hashes is None:
+                    # Lookup is not supported or has failed.
+                    items_left.extend(host_items[idx:])
+                    break
+                for handler, torrents in chunk:
+                    if handler.torrent_hashes != set([info_hashes.get(handler.resource_url)]):
+                        items_left.append((handler, torrents))
+                        continue
+                    self.count_saved_requests(len(torrents))
+                    for torrent_data in torrents:
+                        log.info('Updatorr \tSKIPPED Torrent %s is up-to-date (according to tracker)' % torrent_data['name'])
+                        self.scheduler.checked(torrent_data['hash'], False)
+        return items_left
+
+    def check_torrents(self, item):
+        """Checks torrents sharing a thread page for updates
+        and replaces them with updated ones if any.
+
+        `item` is a tuple (tracker handler, list of torrents data).
+        Thread page and .torrent file are got only once for all
+        those torrents.
+
+        This one is run by walker pool threads, so Deluge core
+        is accessed through reactor thread (see `replace_torrent()`).
+
+        """
+        tracker_handler, torrents = item
+        try:
+            self._check_torrents(tracker_handler, torrents)
+        finally:
+            # Tracker session cookies may change whatever the outcome is (e.g. on login).
+            if self.persist_cookies(tracker_handler.tracker_host):
+                self.mark_config_dirty()
+
+    def _check_torrents(self, tracker_handler, torrents):
+        """Checks torrents sharing a thread page (see `check_torrents()`)."""
+        if get_client().get_limiter(tracker_handler.resource_url).is_open():
+            # Torrents stay pending, so they are rescheduled to the next cycle.
+            log.info('Updatorr \tDEFERRED Requests to %s are suspended' % tracker_handler.tracker_host)
+            return
+
+        new_torrent_contents = tracker_handler.get_torrent_file()
+        if new_torrent_contents is NOT_MODIFIED:
+            self.count_saved_requests(len(torrents) - 1)
+            for torrent_data in torrents:
+                log.info('Updatorr \tSKIPPED Torrent %s is up-to-date (according to thread page)' % torrent_data['name'])
+                self.scheduler.checked(torrent_data['hash'], False)
+            if tracker_handler.get_page_state():
+                # Thread page was got and confirmed to be up-to-date.
+                self.store_page_state(tracker_handler, tracker_handler.torrent_hashes)
+            return
+        if new_torrent_contents is None:
+            for torrent_data in torrents:
+                self.dump_error(torrent_data['hash'], 'Error in tracker handling: %s' % tracker_handler.get_error_text())
+            return
+        # Both thread page and .torrent file requests are saved.
+        self.count_saved_requests((len(torrents) - 1) * 2)
+
+        if is_torrent_filepath(new_torrent_contents):
+            # Some handlers may still return a path to a temporary .torrent file.
+            new_torrent_filepath = new_torrent_contents
+            new_torrent_contents = read_torrent_file(new_torrent_filepath)
+            # No littering, remove temporary .torrent file.
+            os.remove(new_torrent_filepath)
+
+        if self.config['store_tmp_torrents']:
+            log.debug('Updatorr \tTorrent file is stored in %s' % tracker_handler.store_tmp_torrent(new_torrent_contents))
+
+        try:
+            new_torrent_info = run(summarize_torrent, new_torrent_contents, list(tracker_handler.torrent_hashes))
+        except Exception, e:
+            # E.g. an html page is got instead of .torrent file.
+            log.debug('Updatorr \tUnable to read torrent file: %s' % e)
+            for torrent_data in torrents:
+                self.dump_error(torrent_data['hash'], 'File got from %s is not a .torrent file' % tracker_handler.resource_url)
+            return
+        confirmed = True
+        for torrent_data in torrents:
+            confirmed = self.update_torrent(torrent_data, new_torrent_contents, new_torrent_info) and confirmed
+        if confirmed:
+            # Thread page state is remembered only for confirmed up-to-date (or updated) torrents.
+            self.store_page_state(tracker_handler, [new_torrent_info['hash']])
+
+    def store_page_state(self, tracker_handler, hashes):
+        """Stores thread page state from the current check along with
+        info-hashes of torrents confirmed against that page.
+
+        """
+        page_state = tracker_handler.get_page_state()
+        if page_state:
+            page_state = dict(page_state, hashes=sorted(hashes))
+        self.page_cache.set(tracker_handler.resource_url, page_state)
+
+    def update_torrent(self, torrent_data, new_torrent_contents, new_torrent_info):
+        """Replaces a torrent with a new one from the given
+        .torrent file contents if torrent hash differs.
+
+        Returns boolean to identify whether torrent is either
+        confirmed up-to-date or successfully updated.
+
+        """
+        torrent_id = torrent_data['hash']
+        if torrent_id == new_torrent_info['hash']:
+            log.info('Updatorr \tSKIPPED Torrent %s is up-to-date' % torrent_data['name'])
+            self.scheduler.checked(torrent_id, False)
+            return True
+        log.info('Updatorr \tTorrent update is available for %s' % torrent_data['name'])
+
+        new_torrent_prefs = run(get_new_prefs, torrent_data, new_torrent_info)
+
+        replaced = threads.blockingCallFromThread(
+            reactor, self.replace_torrent, torrent_id, new_torrent_info['hash'],
+            base64.encodestring(new_torrent_contents), new_torrent_prefs)
+        if not replaced:
+            self.dump_error(torrent_id, 'Unable to replace current torrent with a new one')
+            return False
+        log.info('Updatorr \tTorrent %s is updated' % torrent_data['name'])
+        return True
+
+    def replace_torrent(self, torrent_id, new_torrent_id, torrent_contents, torrent_prefs):
+        """Replaces a torrent in Deluge session with a new one
+        from base64 encoded .torrent file contents.
+        Returns boolean to identify whether torrent is replaced.
+
+        This one is run in reactor thread, so torrents
+        replacements are serialized.
+
+        """
+        if self.core.add_torrent_file(None, torrent_contents, torrent_prefs) is None:
+            return False
+        self.core.remove_torrent(torrent_id, False)
+        # Index is updated right away not to depend on torrents events order.
+        self.index_torrent(new_torrent_id)
+        self.resource_index.discard(torrent_id)
+        # Schedule state is inherited by the new torrent.
+        self.scheduler.rename(torrent_id, new_torrent_id)
+        self.scheduler.checked(new_torrent_id, True)
+        # Fire up update finished event.
+        component.get('EventManager').emit(UpdatorrUpdateDoneEvent(new_torrent_id))
+        # Add new torrent hash to continue autoupdates.
+        self.set_items_to_update(new_torrent_id, True)
+        # Remove old torrent from autoupdates list.
+        self.set_items_to_update(torrent_id, False)
+        return True
+
+    def get_torrents_statuses(self, torrent_ids):
+        """Returns a dictionary with Deluge session data of the given
+        torrents: torrent ID -> status. Unknown torrents are omitted.
+
+        Called from walker thread, statuses are got in reactor thread
+        in small batches, so that RPC requests are served in between.
+        Unknown torrents may also be given empty statuses.
+
+        """
+        statuses = {}
+        for idx in range(0, len(torrent_ids), self.STATUS_BATCH):
+            statuses.update(threads.blockingCallFromThread(
+                reactor, self._get_torrents_statuses, torrent_ids[idx:idx + self.STATUS_BATCH]))
+        return statuses
+
+    def _get_torrents_statuses(self, torrent_ids):
+        # Only required keys are requested, since building full status is costly.
+        # That may return a Deferred, which is waited for by blockingCallFromThread.
+        return self.core.get_torrents_status({'id': torrent_ids}, TORRENT_STATUS_KEYS)
+
+    def emit_event(self, event):
+        """Fires an event from reactor thread. May be called from any thread."""
+        reactor.callFromThread(component.get('EventManager').emit, event)
+
+    def count_saved_requests(self, count):
+        """Adds to a number of requests saved within the current walk."""
+        with self.stats_lock:
+            self.saved_requests += count
+
     def dump_error(self, torrent_id, text):
         """Logs error and fires error event."""
         log.info('Updatorr \tSKIPPED %s' % text)
-        component.get('EventManager').emit(UpdatorrErrorEvent(torrent_id, text))
+        self.emit_event(UpdatorrErrorEvent(torrent_id, text))
 
     @export
     def set_items_to_update(self, torrent_id, do_update):
         """Adds or removes given torrent to the `torrents-to-update list`."""
-        if do_update:
-            if torrent_id not in self.torrents_to_update:
-                self.torrents_to_update.append(torrent_id)
-        elif torrent_id in self.torrents_to_update:
-            self.torrents_to_update.remove(torrent_id)
-        self.save_config()
+        self.set_items_to_update_many([torrent_id], do_update)
+
+    @export
+    def set_items_to_update_many(self, torrent_ids, do_update):
+        """Adds or removes given torrents to the `torrents-to-update list`.
+        Torrents without URL of a supported tracker are not added."""
+        for torrent_id in torrent_ids:
+            if do_update:
+                if not self.resource_index.is_supported(torrent_id):
+                    log.info('Updatorr No supported tracker URL found in comment of torrent %s' % torrent_id)
+                    continue
+                self.torrents_to_update.add(torrent_id)
+                self.scheduler.add(torrent_id)
+            else:
+                self.torrents_to_update.discard(torrent_id)
+                self.scheduler.remove(torrent_id)
+        if do_update and self.trickle:
+            self.scheduler.spread_due(self.get_walk_period_seconds())
+        self.mark_config_dirty()
+
+    @export
+    def get_updatable(self, torrent_ids):
+        """Returns a list of given torrent IDs having
+        URL of a supported tracker in comment."""
+        return [torrent_id for torrent_id in torrent_ids if self.resource_index.is_supported(torrent_id)]
+
+    @export
+    def get_resources(self, torrent_ids=None):
+        """Returns a dictionary with forum thread URLs of torrents from
+        resources index: torrent ID -> [URL, tracker domain or None].
+        All indexed torrents are returned if `torrent_ids` is None."""
+        if torrent_ids is None:
+            torrent_ids = self.torrents.keys()
+        resources = {}
+        for torrent_id in torrent_ids:
+            resource = self.resource_index.get(torrent_id)
+            if resource is not None:
+                resources[torrent_id] = [resource[0], resource[1]]
+        return resources
 
     @export
     def check_is_to_update(self, torrent_id):
@@ -281,8 +798,8 @@ class Core(CorePluginBase):
 
     @export
     def get_items_to_update(self):
-        """Retunt a lis of to"""
-        return self.torrents_to_update
+        """Returns a list of torrent IDs set to update."""
+        return self.torrents_to_update.to_list()
 
     @export
     def set_config(self, config=None):
@@ -290,6 +807,13 @@ class Core(CorePluginBase):
         log.debug('Updatorr sets config')
         if config is not None:
             self.walk_period = config['walk_period']
+            self.walk_concurrency = config.get('walk_concurrency', self.walk_concurrency)
+            self.trickle = config.get('trickle', self.trickle)
+            self.walk_time_budget = config.get('walk_time_budget', self.walk_time_budget)
+            self.scheduler.base_interval = self.get_walk_period_seconds()
+            self.configure_trickle()
+            self.use_process_pool = config.get('use_process_pool', self.use_process_pool)
+            self.configure_process_pool()
             self.trackers_settings = config['trackers_settings']
         self.save_config()
 
@@ -299,12 +823,60 @@ class Core(CorePluginBase):
         log.debug('Updatorr gets config')
         return self.config.config
 
+    def persist_cookies(self, tracker_host=None):
+        """Copies changed cookies of tracker sessions (of the given tracker
+        or of every one) into trackers settings to enter trackers
+        without logins in future sessions.
+        Returns boolean to identify whether any cookies are copied.
+
+        """
+        persisted = False
+        for host, session in SESSIONS.get_sessions().items():
+            if tracker_host not in (None, host) or host not in self.trackers_settings:
+                continue
+            if session.cookies.dirty:
+                session.cookies.dirty = False
+                self.trackers_settings[host]['cookies'] = session.cookies.to_dict()
+                persisted = True
+        return persisted
+
+    def mark_config_dirty(self):
+        """Marks configuration as changed and schedules
+        its saving in SAVE_DELAY seconds, so that a number of
+        changes is coalesced into a single write.
+        May be called from any thread.
+
+        """
+        self.config_dirty = True
+        reactor.callFromThread(self._schedule_save)
+
+    def _schedule_save(self):
+        """Schedules debounced configuration save if not yet scheduled."""
+        if self._save_call is None or not self._save_call.active():
+            self._save_call = reactor.callLater(self.SAVE_DELAY, self._save_if_dirty)
+
+    def _save_if_dirty(self):
+        """Saves configuration if it has been changed."""
+        self._save_call = None
+        if self.config_dirty:
+            self.save_config()
+
     def save_config(self):
-        """Dumps configuration file to file system ~/.config/deluge/updatorr.conf."""
+        """Dumps configuration file to file system ~/.config/deluge/updatorr.conf.
+        Deluge writes the file atomically (through a temporary file and rename).
+
+        """
+        self.config_dirty = False
         # Going through every name to be sure...
         self.update_trackers_settings()
+        self.persist_cookies()
         self.config['walk_period'] = int(self.walk_period)
+        self.config['walk_concurrency'] = max(1, int(self.walk_concurrency))
+        self.config['trickle'] = bool(self.trickle)
+        self.config['walk_time_budget'] = int(self.walk_time_budget)
+        self.config['use_process_pool'] = bool(self.use_process_pool)
         self.config['last_walk'] = int(self.last_walk)
-        self.config['torrents_to_update'] = self.torrents_to_update
+        self.config['torrents_to_update'] = self.torrents_to_update.to_list()
+        self.config['schedule'] = self.scheduler.get_state()
         self.config['trackers_settings'] = self.trackers_settings
         self.config.save()
@@ -87,16 +87,9 @@ Deluge.plugins.UpdatorrPlugin = Ext.extend(Deluge.Plugin, {
 
 	onToggleClick: function(item) {
 		var enable = item.text == this.toggleLabel[true];
-		var ids = deluge.torrents.getSelectedIds();
-		Ext.each(ids, function(id, i) {
-			if (ids.length == i +1 ) {
-				deluge.client.updatorr.set_items_to_update(id, enable, {
-					success: function() {
-						deluge.ui.update();
-					}
-				});
-			} else {
-				deluge.client.updatorr.set_items_to_update(id, enable);
+		deluge.client.updatorr.set_items_to_update_many(deluge.torrents.getSelectedIds(), enable, {
+			success: function() {
+				deluge.ui.update();
 			}
 		});
 	}
@@ -0,0 +1,85 @@
+import time
+import threading
+
+
+class FeedIndex(object):
+    """In-memory index of tracker RSS feeds items by forum thread
+    identifier, used to check only torrents updated since their last check.
+
+    Feeds are fetched with tracker handlers (see `parse_feed()`) at most
+    once per `max_age` seconds for every tracker host, and failed fetches
+    are not retried for `max_age` seconds either.
+
+    """
+
+    def __init__(self, max_age=600):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # host -> {'entries': {topic_id: entry}, 'since': timestamp, 'fetched': timestamp}
+        self._hosts = {}
+        # host -> timestamp of the last failed fetch.
+        self._failed = {}
+
+    def update(self, tracker_handler):
+        """Fetches and indexes feeds of the tracker associated with
+        the given handler unless those are fresh enough.
+        Returns boolean to identify whether the tracker is indexed.
+
+        """
+        host = tracker_handler.tracker_host
+        with self._lock:
+            indexed = self._hosts.get(host)
+            failed = self._failed.get(host)
+        if indexed is not None and time.time() - indexed['fetched'] < self.max_age:
+            return True
+        if failed is not None and time.time() - failed < self.max_age:
+            return False
+
+        feed_urls = tracker_handler.get_feed_urls()
+        if not feed_urls:
+            return False
+
+        fetched = time.time()
+        entries = {}
+        since = 0
+        for feed_url in feed_urls:
+            contents = tracker_handler.get_resource(feed_url)[1]
+            feed_entries = contents and tracker_handler.parse_feed(contents)
+            if not feed_entries:
+                # Incomplete index would make torrents look up-to-date.
+                with self._lock:
+                    self._hosts.pop(host, None)
+                    self._failed[host] = fetched
+                return False
+            # Feed lists items updated since its oldest one, and it is
+            # unknown which feed a torrent belongs to, so the latest is used.
+            since = max(since, min(entry['updated'] for entry in feed_entries.values()))
+            for topic_id, entry in feed_entries.items():
+                if topic_id not in entries or entries[topic_id]['updated'] < entry['updated']:
+                    entries[topic_id] = entry
+
+        with self._lock:
+            self._hosts[host] = {'entries': entries, 'since': since, 'fetched': fetched}
+            self._failed.pop(host, None)
+        return True
+
+    def get_fetched(self, host):
+        """Returns time feeds of the given tracker were fetched at or None."""
+        with self._lock:
+            indexed = self._hosts.get(host)
+        if indexed is None:
+            return None
+        return indexed['fetched']
+
+    def is_updated(self, host, topic_id, last_check):
+        """Returns True if forum thread is listed in tracker feeds as updated
+        since `last_check`, False if it is not, and None if feeds
+        do not reach back to `last_check`.
+
+        """
+        with self._lock:
+            indexed = self._hosts.get(host)
+        if indexed is None or topic_id is None or last_check < indexed['since']:
+            return None
+        entry = indexed['entries'].get(topic_id)
+        return entry is not None and entry['updated'] >= last_check
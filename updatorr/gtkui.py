@@ -71,6 +71,7 @@ class GtkUI(GtkPluginBase):
 
     plugin_id = 'Updatorr'
     trackers_data_model = None
+    trackers_settings = {}
     status_bar_item = None
 
     def get_resource(self, name):
@@ -115,7 +116,10 @@ class GtkUI(GtkPluginBase):
             self.status_bar_item.set_text(_('Updates are not checked yet'))
         else:
             last_updated = datetime.fromtimestamp(status_data[0]).strftime(self.DATE_FORMAT)
-            next_update = datetime.fromtimestamp(int(status_data[0]) + int(status_data[1] * 3600)).strftime(self.DATE_FORMAT)
+            next_update = status_data[3]
+            if next_update is None:
+                next_update = int(status_data[0]) + int(status_data[1] * 3600)
+            next_update = datetime.fromtimestamp(next_update).strftime(self.DATE_FORMAT)
             # Note that format used is locale-specific and UTF-8 encoding is required for UI output.
             if CURRENT_LOCALE is not None:
                 last_updated = last_updated.decode(CURRENT_LOCALE).encode('utf8')
@@ -233,11 +237,17 @@ class GtkUI(GtkPluginBase):
         n.set_message(_('Updates check is started'))
         n.notify(None)
 
-    def on_updates_finished_event(self):
+    def on_updates_finished_event(self, partial=False, saved_requests=0):
         """Triggers when torrent update is finished.
         Notifies user abount the event."""
         n = UpdatorNotification()
-        n.set_message(_('Updates check is finished'))
+        if partial:
+            message = _('Updates check is partially finished (time is up)')
+        else:
+            message = _('Updates check is finished')
+        if saved_requests:
+            message = '%s, %s %s' % (message, saved_requests, _('requests saved'))
+        n.set_message(message)
         n.notify(None)
 
     # Context menu `toggle autoupdates` item states.
@@ -295,6 +305,7 @@ class GtkUI(GtkPluginBase):
     def on_cmenu_focus(self, *args, **kwargs):
         """Triggered when torrents list context menu is summoned."""
         client.updatorr.get_items_to_update().addCallback(self.update_cmenu_item_toggle)
+        client.updatorr.get_updatable(self.get_selected_torrents()).addCallback(self.update_cmenu_item_updatable)
         client.updatorr.is_walking().addCallback(self.update_cmenu_item_run)
 
     def update_cmenu_item_run(self, is_walking):
@@ -315,14 +326,18 @@ class GtkUI(GtkPluginBase):
         else:
             self.cmenu_item_toggle.set_label(self.CONTEXT_UPDATE_CHOICES[True])
 
+    def update_cmenu_item_updatable(self, updatable):
+        """Disables `toggle autoupdates` context menu item
+        if no selected torrent has a supported tracker URL."""
+        self.cmenu_item_toggle.set_sensitive(bool(updatable))
+
     def on_cmenu_item_toggle_activate(self, widget):
         """Triggered when `toggle autoupdates` context menu item is pushed."""
         enable = False
         if widget.get_label() == self.CONTEXT_UPDATE_CHOICES[True]:
             enable = True
         widget.set_label(self.CONTEXT_UPDATE_CHOICES[not enable])
-        for torrent_id in self.get_selected_torrents():
-            client.updatorr.set_items_to_update(torrent_id, enable)
+        client.updatorr.set_items_to_update_many(self.get_selected_torrents(), enable)
 
     def on_cmenu_item_run_activate(self, widget):
         """Triggered when `check for updates` context menu item is pushed."""
@@ -341,7 +356,10 @@ class GtkUI(GtkPluginBase):
         trackers_settings = {}
 
         for row in self.trackers_data_model:
-            trackers_settings[row[0]] = {'login': row[2], 'password': row[3]}
+            # Other tracker settings (e.g. concurrency) are preserved.
+            domain_settings = dict(self.trackers_settings.get(row[0], {}))
+            domain_settings.update({'login': row[2], 'password': row[3]})
+            trackers_settings[row[0]] = domain_settings
 
         config = {
             'walk_period': self.glade.get_widget('walk_period').get_text(),
@@ -359,6 +377,7 @@ class GtkUI(GtkPluginBase):
         """Reads Updatorr configuration and puts data from it into
         preferences window UI controls."""
         self.glade.get_widget('walk_period').set_value(config['walk_period'])
+        self.trackers_settings = config['trackers_settings']
         self.populate_tv_trackers(config['trackers_settings'])
 
     def populate_tv_trackers(self, settings):
@@ -1,17 +1,188 @@
 import os
 import re
+import base64
+import hashlib
 import tempfile
-import urllib2
 
-from urllib import urlencode
-from updatorr.utils import Cookies
+from email.utils import parsedate_tz, mktime_tz
+from xml.etree import ElementTree
+
+from updatorr.http_client import get_client, blocking_request, blocking_stream, BodyStream
+from updatorr.sessions import SESSIONS
+from updatorr.workers import run, scan_links
 
 
 # This regex is used to get all hyperlinks from html.
 RE_LINK = re.compile(r'href\s*=\s*"\s*([^"]+)\s*"[^>]*>', re.S | re.I | re.M)
 
-# Cookie registry holds cookies from different tracker hosts.
-COOKIES_REGISTRY = {}
+# This regex is used to get an info-hash from a magnet link (hex or base32 encoded).
+RE_BTIH = re.compile(r'magnet:\?\S*?xt=urn:btih:([0-9a-f]{40}|[a-z2-7]{32})', re.I)
+
+# Returned by `get_torrent_file()` when torrent is known to be up-to-date
+# without .torrent file download (e.g. thread page is not modified).
+NOT_MODIFIED = object()
+
+
+class ResourceNotModified(Exception):
+    """Raised when a conditionally requested resource is not modified."""
+
+
+class PageUnchanged(ResourceNotModified):
+    """Raised when thread page fingerprint is the same
+    as on the previous confirmed check.
+
+    """
+
+
+class InfoHashMatched(ResourceNotModified):
+    """Raised when thread page advertises an info-hash
+    of the torrent being checked (e.g. in a magnet link).
+
+    """
+
+
+def get_magnet_hash(link):
+    """Returns hex info-hash from a magnet link or None."""
+    match = RE_BTIH.search(link)
+    if match is None:
+        return None
+    info_hash = match.group(1)
+    if len(info_hash) == 32:
+        info_hash = base64.b32decode(info_hash.upper()).encode('hex')
+    return info_hash.lower()
+
+
+class LinkScanner(object):
+    """Incremental hyperlinks scanner fed with html chunks.
+
+    If `kinds` (names of groups in `pattern`) are given, scanner yields
+    (kind, match) tuples for the first matched group, otherwise
+    hyperlinks from the first group are yielded.
+
+    """
+
+    # Maximum length of a chunk tail kept for a link possibly split between chunks.
+    MAX_TAIL = 4096
+
+    def __init__(self, pattern=RE_LINK, kinds=None):
+        self.pattern = pattern
+        self.kinds = kinds
+        self._tail = ''
+        # Number of bytes fed so far.
+        self.position = 0
+        # Stream offsets of the ends of links returned by the last `feed()`.
+        self.ends = []
+
+    def feed(self, chunk):
+        """Returns a list of hyperlinks completed within the given chunk.
+
+        Chunks are scanned in the calling thread: passing every chunk
+        to a worker process costs more than scanning it.
+
+        """
+        data = self._tail + chunk
+        data_start = self.position - len(self._tail)
+        self.position += len(chunk)
+        links, ends, last_end = scan_links(self.pattern, self.kinds, data)
+        if self.kinds is not None:
+            links = [(kind, LinkMatch(groups)) for kind, groups in links]
+        self.ends = [data_start + end for end in ends]
+        self._tail = data[max(last_end, len(data) - self.MAX_TAIL):]
+        return links
+
+
+class LinkMatch(object):
+    """Named groups of a link matched by LinkScanner
+    with `kinds`, mimicking regex match object.
+
+    """
+
+    def __init__(self, groups):
+        self.groups = groups
+
+    def group(self, name):
+        return self.groups[name]
+
+
+class PageFingerprint(object):
+    """Incremental fingerprint of a normalized html page region.
+
+    Scripts, styles and comments are stripped and whitespace is collapsed,
+    so that fingerprint doesn't depend on chunks boundaries.
+    Region is limited with `start` and `end` markers if given
+    (markers are included into region).
+
+    """
+
+    RE_IGNORED = re.compile(r'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->', re.S | re.I)
+    RE_IGNORED_START = re.compile(r'<script\b|<style\b|<!--', re.I)
+    RE_WHITESPACE = re.compile(r'\s')
+
+    def __init__(self, start=None, end=None):
+        self.start = start
+        self.end = end
+        self.started = start is None
+        self.complete = False
+        self._hash = hashlib.sha1()
+        self._tokens_count = 0
+        # Text not yet hashed: a partial token or an unclosed script, style or comment.
+        self._tail = ''
+        # Raw data possibly holding a partial marker.
+        self._marker_tail = ''
+
+    def feed(self, data):
+        """Adds html chunk to fingerprint."""
+        if self.complete:
+            return
+        if not self.started:
+            data = self._marker_tail + data
+            idx = data.find(self.start)
+            if idx < 0:
+                self._marker_tail = data[-(len(self.start) - 1):] if len(self.start) > 1 else ''
+                return
+            self.started = True
+            self._marker_tail = ''
+            data = data[idx:]
+        if self.end is not None:
+            buf = self._marker_tail + data
+            idx = buf.find(self.end)
+            if idx >= 0:
+                self._update(data[:idx + len(self.end) - len(self._marker_tail)])
+                self.finish()
+                return
+            self._marker_tail = buf[-(len(self.end) - 1):] if len(self.end) > 1 else ''
+        self._update(data)
+
+    def _update(self, data, final=False):
+        data = self.RE_IGNORED.sub(' ', self._tail + data)
+        if final:
+            cut = len(data)
+        else:
+            match = self.RE_IGNORED_START.search(data)
+            if match is not None:
+                # Unclosed script, style or comment.
+                cut = match.start()
+            else:
+                # A token may continue in the next chunk.
+                cut = len(data)
+                while cut and not self.RE_WHITESPACE.match(data[cut - 1]):
+                    cut -= 1
+        for token in data[:cut].split():
+            self._hash.update(token + ' ')
+            self._tokens_count += 1
+        self._tail = data[cut:]
+
+    def finish(self):
+        """Completes fingerprint with the rest of data fed."""
+        if not self.complete and self.started:
+            self._update('', final=True)
+        self.complete = True
+
+    def get_digest(self):
+        """Returns fingerprint hex string or None if region is empty."""
+        if not self._tokens_count:
+            return None
+        return self._hash.hexdigest()
 
 
 class BaseTrackerHandler(object):
@@ -20,6 +191,26 @@ class BaseTrackerHandler(object):
 
     # This tells Updatorr that login procedure is required.
     login_required = True
+    # Default number of torrents allowed to be checked simultaneously
+    # on this tracker (see `concurrency` in trackers settings).
+    concurrency = 2
+    # Number of bytes to receive after the download link is found looking
+    # for a magnet link (for pages where magnet link follows download link).
+    magnet_lookahead = 0
+    # Whether thread page shows magnet links to guests, so that
+    # there is no need to log in before the page is checked.
+    guest_magnet = False
+    # Markers limiting thread page region fingerprinted to detect
+    # unchanged pages (the whole page received is fingerprinted by default).
+    # Region should hold release description but no counters (views, peers, etc.),
+    # otherwise a page would never be found unchanged.
+    fingerprint_start = None
+    fingerprint_end = None
+    # Maximum number of thread URLs passed to `get_info_hashes()` at once.
+    info_hashes_batch = 100
+    # RSS feeds listing recently updated forum threads (see `parse_feed()`),
+    # may be overridden with `feed_urls` tracker setting.
+    feed_urls = ()
 
     def __init__(self, tracker_host, torrent_data, logger):
         # Torrent tracker host this handler is associated with.
@@ -28,10 +219,24 @@ class BaseTrackerHandler(object):
         self.torrent_data = torrent_data
         # Torrent hash from Deluge session data.
         self.torrent_hash = torrent_data.get('hash')
+        # Hashes of all torrents sharing this thread page (checked at once).
+        self.torrent_hashes = set([self.torrent_hash])
         # Resource URL from torrent comment.
         self.resource_url = torrent_data.get('comment')
+        # Info-hash advertised by thread page (see `check_magnet_link()`).
+        self.advertised_hash = None
         # Tracker specific settings (e.g. credentials).
         self._tracker_settings = {}
+        # Thread page state from the previous confirmed check (e.g. HTTP validators).
+        self._page_state = {}
+        # Thread page state from the current check.
+        self._new_page_state = {}
+        # Tracker session generation thread page was got within.
+        self._session_generation = 0
+        # Number of HTTP requests made with this handler.
+        self.requests_count = 0
+        # Timestamp requests are not retried past (walk time budget end).
+        self.deadline = None
         # Occured error description.
         self._error_text = ''
         # Updatorr plugin logger instance.
@@ -43,9 +248,9 @@ class BaseTrackerHandler(object):
         if setting is None:
             setting = {}
         self._tracker_settings = setting
-        # Initialize cookies data from previous handler session.
-        if 'cookies' in setting:
-            self.reset_cookies(setting['cookies'])
+        # Tracker session is shared by handlers and initialized
+        # with cookies data from previous Updatorr run.
+        SESSIONS.get_session(self.tracker_host, setting.get('cookies'))
 
     def get_settings(self, field=None):
         """Returns tracker specific settings dictionary.
@@ -55,6 +260,26 @@ class BaseTrackerHandler(object):
             return self._tracker_settings
         return self._tracker_settings.get(field)
 
+    def set_page_state(self, state):
+        """Stores thread page state from the previous confirmed check."""
+        self._page_state = state or {}
+
+    def is_page_state_confirmed(self):
+        """Returns boolean to identify whether thread page state was stored
+        when every torrent being checked was confirmed against that page
+        (see `hashes` in page state), so that an unchanged page means
+        those torrents are up-to-date.
+
+        """
+        return self.torrent_hashes.issubset(self._page_state.get('hashes') or ())
+
+    def get_page_state(self):
+        """Returns thread page state from the current check
+        to be stored if the torrent is confirmed up-to-date.
+
+        """
+        return self._new_page_state
+
     def login(self, login, password):
         """Tracker login procedure should be implemented
         in child class if necessary."""
@@ -69,27 +294,196 @@ class BaseTrackerHandler(object):
         self._error_text = text
         self.debug('Error: %s' % text)
 
-    def get_resource(self, url, form_data=None):
+    def get_resource(self, url, form_data=None, headers=None):
         """Returns an HTTP resource data from given URL.
         If a dictionary is passed in `form_data` POST HTTP method
         would be used to pass data to resource (even if that dictionary is empty).
+        Additional request headers may be passed in `headers` dictionary.
+
+        Raises `ResourceNotModified` on HTTP 304.
+
+        This is a synchronous shim over `get_resource_async()`,
+        so it should not be called from reactor thread.
 
         """
         self.debug('Getting page at %s ...' % url)
+        self.requests_count += 1
+        try:
+            code, headers, contents = blocking_request(url, form_data, self.get_cookies(), headers, self.deadline)
+        except Exception, e:
+            self.debug('Unable to get %s: %s' % (url, e))
+            return {}, ''
 
-        if form_data is not None:
-            form_data = urlencode(form_data)
+        if code == 304:
+            raise ResourceNotModified(url)
 
-        opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(self.get_cookies()))
-        request = urllib2.Request(url, form_data,
-                                  {'User-agent': 'Mozilla/5.0 (Ubuntu; X11; Linux i686; rv:8.0) Gecko/20100'})
+        if code >= 400:
+            self.debug('Unable to get %s: HTTP %s' % (url, code))
+            return {}, ''
+
+        return headers, contents
 
+    def get_resource_async(self, url, form_data=None, headers=None):
+        """Same as `get_resource()` but returns a Deferred
+        firing with a tuple: (status code, headers dictionary, contents).
+
+        """
+        self.debug('Getting page at %s ...' % url)
+        self.requests_count += 1
+        return get_client().request(url, form_data, self.get_cookies(), headers, self.deadline)
+
+    def get_resource_stream(self, url, form_data=None, headers=None):
+        """Same as `get_resource()` but returns a tuple
+        (headers dictionary, BodyStream object), so that
+        resource contents could be processed while received.
+
+        """
+        self.debug('Streaming page at %s ...' % url)
+        self.requests_count += 1
         try:
-            response = opener.open(request)
-        except urllib2.URLError:
-            return {}, ''
+            code, headers, stream = blocking_stream(url, form_data, self.get_cookies(), headers, self.deadline)
+        except Exception, e:
+            self.debug('Unable to get %s: %s' % (url, e))
+            return {}, BodyStream()
+
+        if code == 304:
+            raise ResourceNotModified(url)
+
+        if code >= 400:
+            self.debug('Unable to get %s: HTTP %s' % (url, code))
+            return {}, BodyStream()
 
-        return response.info(), response.read()
+        return headers, stream
+
+    def _get_page_headers(self):
+        """Returns conditional request headers for thread page
+        made of HTTP validators from the previous confirmed check.
+
+        """
+        self._session_generation = self.get_session().generation
+        headers = {}
+        if not self.is_page_state_confirmed():
+            return headers
+        if self._page_state.get('etag'):
+            headers['If-None-Match'] = self._page_state['etag']
+        if self._page_state.get('last_modified'):
+            headers['If-Modified-Since'] = self._page_state['last_modified']
+        return headers
+
+    def _set_page_response(self, response):
+        """Stores HTTP validators from thread page response."""
+        self._new_page_state = {}
+        if response.get('etag'):
+            self._new_page_state['etag'] = response['etag']
+        if response.get('last-modified'):
+            self._new_page_state['last_modified'] = response['last-modified']
+
+    def get_page(self):
+        """Returns forum thread page contents from resource URL.
+
+        Page is requested conditionally using HTTP validators
+        from the previous confirmed check, and `ResourceNotModified`
+        is raised if the page is not modified since.
+
+        """
+        response, page_html = self.get_resource(self.resource_url, headers=self._get_page_headers())
+        self._set_page_response(response)
+        return page_html
+
+    def scan_page(self, stop=None, scanner=None):
+        """Streams forum thread page (see `get_page()`) and returns
+        a list of hyperlinks found in it by LinkScanner (`scanner`).
+
+        If `stop` callable returns True for a link, that link
+        is the last one in the list, and the rest of the page
+        is not even received (except for `magnet_lookahead` bytes).
+
+        Every link is passed to `check_magnet_link()`, so that
+        `InfoHashMatched` is raised as soon as the page advertises
+        the info-hash of the torrent being checked.
+
+        Page region received is fingerprinted (see `PageFingerprint`),
+        and `PageUnchanged` is raised if fingerprint is the same as on
+        the previous confirmed check. If the region is limited with
+        `fingerprint_end` marker, page is received up to that marker
+        even past the last link needed.
+
+        """
+        response, stream = self.get_resource_stream(self.resource_url, headers=self._get_page_headers())
+        self._set_page_response(response)
+        if scanner is None:
+            scanner = LinkScanner()
+        fingerprint = PageFingerprint(self.fingerprint_start, self.fingerprint_end)
+        bounded = self.fingerprint_end is not None
+        links = []
+        received = 0
+        stop_at = None
+        try:
+            for chunk in stream:
+                chunk_start = received
+                received += len(chunk)
+                chunk_links = scanner.feed(chunk)
+                for idx, link in enumerate(chunk_links):
+                    if stop_at is not None and scanner.ends[idx] > stop_at:
+                        # Links past `magnet_lookahead` are received along
+                        # with the fingerprinted region only.
+                        break
+                    self.check_magnet_link(link)
+                    if stop_at is None:
+                        links.append(link)
+                        if stop is not None and stop(link):
+                            # Cut at link end rather than at chunk end to get the same
+                            # fingerprint regardless of chunks boundaries.
+                            stop_at = scanner.ends[idx] + self.magnet_lookahead
+                if stop_at is None or bounded:
+                    fingerprint.feed(chunk)
+                else:
+                    fingerprint.feed(chunk[:stop_at - chunk_start])
+                if stop_at is not None and received >= stop_at and (fingerprint.complete or not bounded):
+                    break
+        finally:
+            stream.close()
+        # Fingerprint is checked once magnet links (if any) are seen.
+        fingerprint.finish()
+        self.check_fingerprint(fingerprint)
+        return links
+
+    def check_fingerprint(self, fingerprint):
+        """Stores thread page fingerprint into page state.
+        Raises `PageUnchanged` if it is the same as on the previous confirmed check
+        and the page does not advertise another info-hash.
+
+        """
+        digest = fingerprint.get_digest()
+        if digest is None:
+            return
+        self._new_page_state['fingerprint'] = digest
+        if self.advertised_hash is not None and self.torrent_hashes != set([self.advertised_hash]):
+            return
+        if digest == self._page_state.get('fingerprint') and self.is_page_state_confirmed():
+            raise PageUnchanged(self.resource_url)
+
+    def check_magnet_link(self, link):
+        """Stores info-hash if the given link (or a (kind, match) tuple
+        from LinkScanner) is a magnet link.
+
+        Raises `InfoHashMatched` if it equals the hash of the torrent being checked
+        (of every torrent sharing thread page, see `torrent_hashes`).
+
+        """
+        if not isinstance(link, basestring):
+            kind, match = link
+            if kind != 'magnet':
+                return
+            link = match.group(kind)
+        if not link.startswith('magnet:'):
+            return
+        info_hash = get_magnet_hash(link)
+        if info_hash is None:
+            return
+        self.advertised_hash = info_hash
+        if self.torrent_hashes == set([info_hash]):
+            raise InfoHashMatched(self.resource_url)
 
     def store_tmp_torrent(self, file_contents):
         """Stores downloaded .torrent file contents
@@ -103,20 +497,23 @@ class BaseTrackerHandler(object):
         f.close()
         return fpath
 
-    def set_cookie(self, name, value):
+    def get_session(self):
+        """Returns tracker session shared by handlers."""
+        return SESSIONS.get_session(self.tracker_host)
+
+    def set_cookie(self, name, value, transient=False):
         """Stores a single cookie into cookies registry
-        for further usage.
+        for further usage. Transient cookies are not persisted.
 
         """
-        self.get_cookies().add(name, value)
+        self.get_cookies().add(name, value, transient=transient)
 
     def reset_cookies(self, cookies_dict):
-        """Initializes cookies registry for current tracker
+        """Initializes tracker session (and its cookies)
         with data from the given dictionary.
 
         """
-        global COOKIES_REGISTRY
-        COOKIES_REGISTRY[self.tracker_host] = Cookies(init_from_dict=cookies_dict)
+        SESSIONS.reset_session(self.tracker_host, cookies_dict)
 
     def get_cookies(self, as_dict=False):
         """Returns cookies for this tracker.
@@ -124,23 +521,75 @@ class BaseTrackerHandler(object):
         otherwise return CookieJar object.
 
         """
-        if self.tracker_host not in COOKIES_REGISTRY:
-            COOKIES_REGISTRY[self.tracker_host] = Cookies()
+        cookies = self.get_session().cookies
         if as_dict:
-            return COOKIES_REGISTRY[self.tracker_host].to_dict()
-        return COOKIES_REGISTRY[self.tracker_host]
+            return cookies.to_dict()
+        return cookies
 
     def find_links(self, page_html):
-        """Returns a list witj hyperlinks found in supplied html."""
-        links = []
-        for match in re.finditer(RE_LINK, page_html):
-            links.append(match.group(1))
-        return links
+        """Returns a list witj hyperlinks found in supplied html.
+        Consider `scan_page()` for thread pages.
+
+        """
+        return run(scan_links, RE_LINK, None, page_html)[0]
+
+    def get_topic_id(self, url):
+        """Returns forum thread identifier from the given thread URL
+        or None. Used to match feed entries with torrents.
+
+        """
+        return None
+
+    def get_feed_urls(self):
+        """Returns a list of RSS feeds URLs for the tracker."""
+        feed_urls = self.get_settings('feed_urls') or self.feed_urls
+        if isinstance(feed_urls, basestring):
+            feed_urls = [url.strip() for url in feed_urls.split(',') if url.strip()]
+        return list(feed_urls)
+
+    def parse_feed(self, contents):
+        """Returns a dictionary indexing RSS feed items by forum thread
+        identifier: {topic_id: {'link': thread URL, 'updated': timestamp}},
+        or None if feed cannot be parsed.
+
+        """
+        try:
+            root = ElementTree.fromstring(contents)
+        except Exception, e:
+            self.debug('Unable to parse feed: %s' % e)
+            return None
+        entries = {}
+        for item in root.iter('item'):
+            link = (item.findtext('link') or '').strip()
+            published = parsedate_tz(item.findtext('pubDate') or '')
+            topic_id = self.get_topic_id(link)
+            if topic_id is None or published is None:
+                continue
+            updated = mktime_tz(published)
+            if topic_id not in entries or entries[topic_id]['updated'] < updated:
+                entries[topic_id] = {'link': link, 'updated': updated}
+        return entries
+
+    def get_info_hashes(self, urls):
+        """This method may be implemented in torrent tracker handler
+        class for trackers offering batch info-hashes lookups.
+
+        Should return a dictionary with current info-hashes of torrents
+        from the given forum thread URLs: {url: hex hash}, or None
+        if lookup is not supported or has failed.
+
+        """
+        return None
 
     def get_torrent_file(self):
         """This method should be implemented in torrent tracker
-        handler class and must return .torrent filepath
-        on success or None on failure."""
+        handler class and must return .torrent file contents
+        on success or None on failure.
+
+        Returning .torrent filepath is still supported for
+        handlers storing contents in temporary files.
+
+        """
         return None
 
     def debug(self, text):
@@ -153,19 +602,44 @@ class GenericTrackerHandler(BaseTrackerHandler):
     most common tracker handling methods."""
 
     def get_id_from_link(self):
-        """Returns forum thread identifier from full thread URL."""
-        return self.resource_url.split('=')[1]
+        """Returns forum thread identifier from full thread URL.
+        Query parameters of resource URL are sorted (see `normalize_url()`),
+        so `get_topic_id()` is preferred to the first parameter value.
+
+        """
+        topic_id = self.get_topic_id(self.resource_url)
+        if topic_id is None:
+            topic_id = self.resource_url.split('=')[1]
+        return topic_id
 
     def get_torrent_file(self):
         """This is the main method which returns
-        a filepath to the downloaded file."""
+        the downloaded .torrent file contents.
+
+        `NOT_MODIFIED` is returned if thread page
+        is not modified since the previous confirmed check,
+        or if it advertises the info-hash of the torrent being checked.
+
+        """
         torrent_file = None
-        download_link = self.get_download_link()
+        try:
+            download_link = self.get_download_link()
+        except InfoHashMatched:
+            self.debug('Thread page advertises the same info-hash: %s' % self.resource_url)
+            return NOT_MODIFIED
+        except PageUnchanged:
+            self.debug('Thread page fingerprint is not changed: %s' % self.resource_url)
+            return NOT_MODIFIED
+        except ResourceNotModified:
+            self.debug('Thread page is not modified: %s' % self.resource_url)
+            return NOT_MODIFIED
         if download_link is None:
             self.dump_error('Cannot find torrent file download link at %s' % self.resource_url)
         else:
             self.debug('Torrent download link found: %s' % download_link)
             torrent_file = self.download_torrent(download_link)
+            if torrent_file is None:
+                self.dump_error('Unable to download torrent file from %s' % download_link)
         return torrent_file
 
     def get_download_link(self):
@@ -174,9 +648,8 @@ class GenericTrackerHandler(BaseTrackerHandler):
         raise NotImplementedError()
 
     def download_torrent(self, url):
-        """Gets .torrent file contents from given URL and
-        stores that in a temporary file within a filesystem.
-        Returns a path to that file.
+        """Gets .torrent file contents from given URL.
+        Returns those contents or None on failure.
 
         """
         raise NotImplementedError()
@@ -189,19 +662,24 @@ class GenericPublicTrackerHandler(GenericTrackerHandler):
     login_required = False
 
     def get_id_from_link(self):
-        """Returns forum thread identifier from full thread URL."""
-        return self.resource_url.split('/')[-1]
+        """Returns forum thread identifier from full thread URL
+        (see `GenericTrackerHandler.get_id_from_link()`).
+
+        """
+        topic_id = self.get_topic_id(self.resource_url)
+        if topic_id is None:
+            topic_id = self.resource_url.split('/')[-1]
+        return topic_id
 
     def download_torrent(self, url):
-        """Gets .torrent file contents from given URL and
-        stores that in a temporary file within a filesystem.
-        Returns a path to that file.
+        """Gets .torrent file contents from given URL.
+        Returns those contents or None on failure.
 
         """
         self.debug('Downloading torrent file from %s ...' % url)
         # That was a check that user himself visited torrent's page ;)
         response, contents = self.get_resource(url)
-        return self.store_tmp_torrent(contents)
+        return contents or None
 
 
 class GenericPrivateTrackerHandler(GenericPublicTrackerHandler):
@@ -249,19 +727,60 @@ class GenericPrivateTrackerHandler(GenericPublicTrackerHandler):
             self.logged_in = True
         return self.logged_in
 
+    def session_login(self):
+        """Logs in using tracker credentials from settings through
+        tracker session shared by handlers, so that concurrent logins
+        are collapsed into a single one. Returns login result.
+
+        """
+        return self.get_session().login(
+            lambda: self.login(self.get_settings('login'), self.get_settings('password')),
+            self._session_generation)
+
+    def relogin(self):
+        """Should be called when a "guest" page is got.
+        Drops cached authenticated state and logs in again.
+        Returns login result.
+
+        """
+        self.get_session().invalidate(self._session_generation)
+        return self.session_login()
+
+    def prepare_session(self):
+        """Logs in beforehand unless tracker session is
+        already authenticated or no credentials are set.
+        Returns boolean to identify whether session is authenticated.
+
+        """
+        session = self.get_session()
+        if session.is_logged_in(self.cookie_logged_in):
+            return True
+        if not self.get_settings('login') or not self.get_settings('password'):
+            return False
+        self._session_generation = session.generation
+        return self.session_login()
+
+    def get_torrent_file(self):
+        """Validates tracker session before getting .torrent file
+        (unless magnet links are shown to guests).
+
+        """
+        if not self.guest_magnet:
+            self.prepare_session()
+        return super(GenericPrivateTrackerHandler, self).get_torrent_file()
+
     def before_download(self):
         """Used to perform some required actions right before .torrent download.
         E.g.: to set a sentinel cookie that allows the download."""
         return True
 
     def download_torrent(self, url):
-        """Gets .torrent file contents from given URL and
-        stores that in a temporary file within a filesystem.
-        Returns a path to that file.
+        """Gets .torrent file contents from given URL.
+        Returns those contents or None on failure.
 
         """
         self.debug('Downloading torrent file from %s ...' % url)
         self.get_cookies()
         self.before_download()
         contents = self.get_resource(url, {})[1]
-        return self.store_tmp_torrent(contents)
+        return contents or None
@@ -0,0 +1,275 @@
+import os
+import re
+import json
+import logging
+
+from ConfigParser import RawConfigParser
+from urlparse import urljoin, parse_qsl
+
+from updatorr.handler_base import GenericPrivateTrackerHandler, GenericPublicTrackerHandler, LinkScanner
+from updatorr.utils import register_tracker_handler
+
+log = logging.getLogger(__name__)
+
+
+class HandlerSpecError(Exception):
+    """Raised on malformed tracker handler specification."""
+
+
+class HandlerSpec(object):
+    """Declarative tracker handler specification.
+
+    Specification is a dictionary with the following keys:
+        host - tracker domain (required);
+        download - .torrent download link regex (required), `{id}` is replaced
+            with a pattern matching forum thread identifier;
+        guest - regex for a link shown instead of download link to guests;
+        magnet - regex for a magnet link advertising torrent info-hash
+            (any magnet link by default, empty string to disable);
+        magnet_lookahead - number of bytes to scan for a magnet link
+            after download link is found;
+        guest_magnet - whether magnet links are shown to guests
+            (no log in before the page is checked then);
+        fingerprint_start, fingerprint_end - markers limiting thread page
+            region fingerprinted to detect unchanged pages;
+        topic_id - regex with a group to get forum thread identifier
+            from thread URL (first number by default);
+        login_url - tracker login form URL (login is required if set);
+        login_fields - login form data dictionary, `%(login)s` and `%(password)s`
+            are replaced with credentials;
+        cookie_logged_in - cookie to verify that a log in was successful;
+        download_cookie - cookie set to forum thread identifier before download;
+        download_method - `GET` or `POST` (default for trackers requiring login);
+        concurrency - number of torrents checked simultaneously;
+        feed_urls - RSS feeds listing recently updated forum threads
+            (a list or a comma-separated string).
+
+    All links patterns are compiled into a single regex,
+    so that a page is matched in one pass.
+
+    """
+
+    # Link kinds in order of precedence.
+    KINDS = ('magnet', 'guest', 'download')
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict) or not spec.get('host') or not spec.get('download'):
+            raise HandlerSpecError('Tracker handler specification requires `host` and `download`: %s' % spec)
+        self.host = spec['host']
+        # Specifications are user editable, so every malformed value
+        # is reported as HandlerSpecError.
+        try:
+            self.parse(spec)
+        except HandlerSpecError:
+            raise
+        except re.error, e:
+            raise HandlerSpecError('Bad pattern for %s: %s' % (self.host, e))
+        except (ValueError, TypeError, KeyError, AttributeError), e:
+            raise HandlerSpecError('Bad specification for %s: %s' % (self.host, e))
+
+    def parse(self, spec):
+        """Initializes specification attributes from dictionary."""
+        self.topic_id = re.compile(spec.get('topic_id', r'(\d+)'))
+        if not self.topic_id.groups:
+            raise HandlerSpecError('`topic_id` pattern for %s requires a group' % self.host)
+        self.login_url = spec.get('login_url')
+        self.login_fields = dict(spec.get('login_fields') or {'username': '%(login)s', 'password': '%(password)s'})
+        # Check that login fields are formatted without errors.
+        self.get_login_form_data('', '')
+        self.cookie_logged_in = spec.get('cookie_logged_in')
+        self.download_cookie = spec.get('download_cookie')
+        self.login_required = self.login_url is not None
+        self.download_method = spec.get('download_method', 'POST' if self.login_required else 'GET').upper()
+        if self.download_method not in ('GET', 'POST'):
+            raise HandlerSpecError('Bad `download_method` for %s: %s' % (self.host, self.download_method))
+        self.concurrency = max(1, int(spec.get('concurrency', GenericPrivateTrackerHandler.concurrency)))
+        self.feed_urls = spec.get('feed_urls') or ()
+        if isinstance(self.feed_urls, basestring):
+            self.feed_urls = [url.strip() for url in self.feed_urls.split(',') if url.strip()]
+        self.feed_urls = [str(url) for url in self.feed_urls]
+        self.magnet_lookahead = max(0, int(spec.get('magnet_lookahead', 0)))
+        self.fingerprint_start = spec.get('fingerprint_start') or None
+        self.fingerprint_end = spec.get('fingerprint_end') or None
+        self.guest_magnet = str(spec.get('guest_magnet', False)).lower() in ('true', 'yes', '1')
+
+        self.patterns = {}
+        for kind in self.KINDS:
+            pattern = spec.get(kind, r'magnet:\?' if kind == 'magnet' else None)
+            if pattern:
+                self.patterns[kind] = pattern
+        self.kinds = [kind for kind in self.KINDS if kind in self.patterns]
+        self.matcher = self.compile()
+
+    def compile(self):
+        """Compiles links patterns into a single regex
+        with a named group for every links kind.
+
+        """
+        alternatives = []
+        for kind in self.kinds:
+            pattern = self.patterns[kind].replace('{id}', r'(?P<%s_id>\w+)' % kind)
+            alternatives.append(r'(?P<%s>[^"]*(?:%s)[^"]*)' % (kind, pattern))
+        try:
+            return re.compile(r'href\s*=\s*"\s*(?:%s)\s*"[^>]*>' % '|'.join(alternatives), re.S | re.I | re.M)
+        except re.error, e:
+            raise HandlerSpecError('Bad link pattern for %s: %s' % (self.host, e))
+
+    def get_topic_id(self, url):
+        """Returns forum thread identifier from thread URL."""
+        match = self.topic_id.search(url)
+        if match is None:
+            return None
+        return match.group(1)
+
+    def is_acceptable(self, kind, match, topic_id):
+        """Checks whether a link matched belongs to the given forum thread
+        (if its pattern has `{id}` placeholder).
+
+        """
+        id_group = '%s_id' % kind
+        if id_group not in self.matcher.groupindex or topic_id is None:
+            return True
+        return match.group(id_group) == topic_id
+
+    def get_login_form_data(self, login, password):
+        """Returns a dictionary with data to be pushed to authorization form."""
+        credentials = {'login': login, 'password': password}
+        return dict((name, value % credentials) for name, value in self.login_fields.items())
+
+
+class DeclarativeTrackerHandler(GenericPrivateTrackerHandler):
+    """Tracker handler driven by HandlerSpec (see `spec` attribute)."""
+
+    spec = None
+
+    def get_login_form_data(self, login, password):
+        """Returns a dictionary with data to be pushed to authorization form."""
+        return self.spec.get_login_form_data(login, password)
+
+    def get_topic_id(self, url):
+        """Returns forum thread identifier from the given thread URL or None."""
+        return self.spec.get_topic_id(url)
+
+    def get_id_from_link(self):
+        """Returns forum thread identifier from full thread URL."""
+        return self.get_topic_id(self.resource_url)
+
+    def before_download(self):
+        """Sets download sentinel cookie if required."""
+        if self.spec.download_cookie:
+            self.set_cookie(self.spec.download_cookie, self.get_id_from_link(), transient=True)
+        return True
+
+    def get_download_link(self):
+        """Tries to find .torrent file download link at forum thread page
+        and return that one."""
+        topic_id = self.get_id_from_link()
+        found = {}
+
+        def stop(item):
+            kind, match = item
+            if kind == 'magnet':
+                # Magnet links are checked by `scan_page()` itself.
+                return False
+            if not self.spec.is_acceptable(kind, match, topic_id):
+                return False
+            found[kind] = match.group(kind)
+            return True
+
+        self.scan_page(stop, LinkScanner(self.spec.matcher, self.spec.kinds))
+
+        if 'guest' in found:
+            self.debug('Login is required to download torrent file.')
+            if self.relogin():
+                return self.get_download_link()
+            return None
+
+        download_link = found.get('download')
+        if download_link is None:
+            return None
+        return urljoin(self.resource_url, download_link.replace('&amp;', '&'))
+
+    def download_torrent(self, url):
+        """Gets .torrent file contents from given URL.
+        Returns those contents or None on failure.
+
+        """
+        if self.spec.download_method == 'GET':
+            return GenericPublicTrackerHandler.download_torrent(self, url)
+        return GenericPrivateTrackerHandler.download_torrent(self, url)
+
+
+def make_handler_class(spec):
+    """Returns a tracker handler class for the given HandlerSpec."""
+    name = '%sHandler' % ''.join(part.capitalize() for part in re.split(r'\W+', spec.host))
+    return type(name, (DeclarativeTrackerHandler,), {
+        'spec': spec,
+        'login_required': spec.login_required,
+        'login_url': spec.login_url,
+        'cookie_logged_in': spec.cookie_logged_in,
+        'concurrency': spec.concurrency,
+        'feed_urls': tuple(spec.feed_urls),
+        'magnet_lookahead': spec.magnet_lookahead,
+        'guest_magnet': spec.guest_magnet,
+        'fingerprint_start': spec.fingerprint_start,
+        'fingerprint_end': spec.fingerprint_end,
+    })
+
+
+def register_handler_spec(spec):
+    """Registers a tracker handler built from specification dictionary.
+    Returns handler class.
+
+    """
+    handler_cls = make_handler_class(HandlerSpec(spec))
+    register_tracker_handler(handler_cls.spec.host, handler_cls)
+    return handler_cls
+
+
+def read_handler_specs(filepath):
+    """Reads tracker handlers specifications from a file.
+
+    JSON files should hold a list of specification dictionaries.
+    INI files should hold a section named after tracker host for every
+    tracker, with `login_fields` given as a query string
+    (e.g. `username=%(login)s&password=%(password)s`).
+
+    """
+    if filepath.endswith('.json'):
+        with open(filepath) as f:
+            return json.load(f)
+
+    parser = RawConfigParser()
+    parser.read(filepath)
+    specs = []
+    for section in parser.sections():
+        spec = dict(parser.items(section))
+        spec['host'] = section
+        if 'login_fields' in spec:
+            spec['login_fields'] = dict(parse_qsl(spec['login_fields']))
+        specs.append(spec)
+    return specs
+
+
+def load_handler_specs(filepath):
+    """Registers tracker handlers from specifications file if it exists.
+    Returns a list of registered tracker hosts.
+
+    """
+    if not os.path.exists(filepath):
+        return []
+    hosts = []
+    try:
+        specs = read_handler_specs(filepath)
+    except Exception, e:
+        log.error('Updatorr Unable to read tracker handlers from %s: %s' % (filepath, e))
+        return hosts
+    for spec in specs:
+        # A bad specification is skipped not to prevent plugin from enabling.
+        try:
+            hosts.append(register_handler_spec(spec).spec.host)
+        except HandlerSpecError, e:
+            log.error('Updatorr %s' % e)
+        except Exception, e:
+            log.error('Updatorr Unable to register tracker handler from %s: %s' % (spec, e))
+    return hosts
@@ -0,0 +1,546 @@
+import time
+import logging
+
+from email.utils import parsedate_tz, mktime_tz
+from Queue import Queue, Empty
+from StringIO import StringIO
+from urllib import urlencode
+
+from twisted.internet import reactor, defer, threads
+from twisted.internet.protocol import Protocol
+from twisted.internet.task import deferLater
+from twisted.internet.endpoints import TCP4ClientEndpoint, wrapClientTLS
+from twisted.internet.ssl import optionsForClientTLS
+from twisted.python import threadable
+from twisted.python.failure import Failure
+from twisted.web.client import Agent, HTTPConnectionPool, ContentDecoderAgent, GzipDecoder, \
+    CookieAgent, BrowserLikeRedirectAgent, FileBodyProducer, PartialDownloadError, readBody
+from twisted.web.http_headers import Headers
+from twisted.internet.interfaces import IStreamClientEndpoint
+from zope.interface import implementer
+
+from updatorr.utils import get_url_host, get_handler_domain
+
+log = logging.getLogger(__name__)
+
+# User agent string sent to trackers.
+USER_AGENT = 'Mozilla/5.0 (Ubuntu; X11; Linux i686; rv:8.0) Gecko/20100'
+
+# Number of idle keep-alive connections kept for every tracker host.
+PERSISTENT_PER_HOST = 4
+
+# Seconds resolved tracker host addresses are kept for.
+DNS_CACHE_TTL = 600
+
+# HTTP codes telling that a tracker is throttling or temporarily down.
+RETRY_CODES = (429, 503)
+
+
+class HostUnavailable(Exception):
+    """Raised when requests to a host are suspended by circuit breaker."""
+
+
+class RequestTimeout(Exception):
+    """Raised when a response is not received in time."""
+
+
+def parse_retry_after(value):
+    """Returns a number of seconds from `Retry-After` header value
+    (either seconds or HTTP date), or None if it is not parsable.
+
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0, mktime_tz(parsed) - time.time())
+
+
+class HostLimiter(object):
+    """Token bucket limiting requests rate to a tracker host
+    with a circuit breaker counting consecutive failures.
+
+    Settings (also accepted from trackers settings):
+        rate - requests per second;
+        burst - number of requests allowed at once;
+        max_retries - retries for throttled or failed requests;
+        max_failures - consecutive failures opening the breaker;
+        breaker_cooldown - seconds the breaker stays open;
+        connect_timeout - seconds to establish a connection;
+        read_timeout - seconds to receive a whole response.
+
+    """
+
+    DEFAULTS = {
+        'rate': 1.0,
+        'burst': 5,
+        'max_retries': 3,
+        'max_failures': 5,
+        'breaker_cooldown': 600,
+        'connect_timeout': 30,
+        'read_timeout': 60,
+    }
+
+    # Lowest values settings are clamped to: zero rate would make
+    # `acquire()` divide by zero, and a breaker should tolerate
+    # a single transient failure.
+    MINIMUMS = {
+        'rate': 0.01,
+        'burst': 1,
+        'max_retries': 0,
+        'max_failures': 2,
+        'breaker_cooldown': 1,
+        'connect_timeout': 1,
+        'read_timeout': 1,
+    }
+
+    # Initial delay in seconds for exponential backoff between retries.
+    BACKOFF_BASE = 2
+
+    def __init__(self, settings=None):
+        self.configure(settings)
+        self.tokens = float(self.burst)
+        self.updated = time.time()
+        self.not_before = 0
+        self.failures = 0
+        self.open_until = 0
+
+    def configure(self, settings=None):
+        """Applies limiter settings from the given dictionary.
+        Bad values are replaced with defaults, and values below
+        `MINIMUMS` are clamped.
+
+        """
+        settings = settings or {}
+        for name, default in self.DEFAULTS.items():
+            value = settings.get(name)
+            if value is None:
+                value = default
+            try:
+                value = type(default)(value)
+            except (TypeError, ValueError):
+                log.warning('Updatorr ignores bad %s setting: %r' % (name, value))
+                value = default
+            setattr(self, name, max(value, type(default)(self.MINIMUMS[name])))
+
+    def acquire(self):
+        """Takes a token from the bucket.
+        Returns a number of seconds to wait before a request.
+
+        """
+        now = time.time()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Tokens may go negative, that reserves them for waiting requests.
+        self.tokens -= 1
+        delay = 0
+        if self.tokens < 0:
+            delay = -self.tokens / self.rate
+        return max(delay, self.not_before - now)
+
+    def pause(self, seconds):
+        """Suspends requests for the given number of seconds."""
+        self.not_before = max(self.not_before, time.time() + seconds)
+
+    def get_backoff(self, attempt):
+        """Returns a delay before the given retry attempt."""
+        return self.BACKOFF_BASE * (2 ** attempt)
+
+    def is_open(self):
+        """Returns boolean to identify whether requests to the host
+        are suspended by circuit breaker.
+
+        """
+        return self.open_until > time.time()
+
+    def success(self):
+        """Registers a successful request."""
+        self.failures = 0
+
+    def failure(self):
+        """Registers a failed request. Opens the breaker
+        after `max_failures` consecutive failures.
+
+        """
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            log.warning('Updatorr suspends requests to a host for %s seconds after %s failures' % (
+                self.breaker_cooldown, self.failures))
+            self.open_until = time.time() + self.breaker_cooldown
+            # A single probe request is allowed after cooldown.
+            self.failures = self.max_failures - 1
+
+    def suspend(self):
+        """Opens the breaker at once, e.g. when a tracker asks
+        to wait longer than `breaker_cooldown`.
+
+        """
+        log.warning('Updatorr suspends requests to a host for %s seconds as asked by the host' % self.breaker_cooldown)
+        self.open_until = time.time() + self.breaker_cooldown
+        self.failures = self.max_failures - 1
+
+
+class DNSCache(object):
+    """Caches tracker host names resolution results."""
+
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = {}
+
+    def resolve(self, host):
+        """Returns a Deferred firing with an address for the given host."""
+        cached = self._cache.get(host)
+        if cached is not None and cached[1] > time.time():
+            return defer.succeed(cached[0])
+
+        def store(address):
+            self._cache[host] = (address, time.time() + self.ttl)
+            return address
+
+        return reactor.resolve(host).addCallback(store)
+
+
+@implementer(IStreamClientEndpoint)
+class CachedDNSEndpoint(object):
+    """Client endpoint resolving its host through DNSCache."""
+
+    def __init__(self, host, port, tls, dns_cache, timeout=30):
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.dns_cache = dns_cache
+        self.timeout = timeout
+
+    def connect(self, protocol_factory):
+
+        def connect(address):
+            endpoint = TCP4ClientEndpoint(reactor, address, self.port, timeout=self.timeout)
+            if self.tls:
+                endpoint = wrapClientTLS(optionsForClientTLS(self.host.decode('ascii')), endpoint)
+            return endpoint.connect(protocol_factory)
+
+        return self.dns_cache.resolve(self.host).addCallback(connect)
+
+
+class CachedDNSEndpointFactory(object):
+    """Agent endpoint factory producing CachedDNSEndpoint objects.
+    `get_timeout` callable should return connect timeout for a host.
+
+    """
+
+    def __init__(self, dns_cache, get_timeout):
+        self.dns_cache = dns_cache
+        self.get_timeout = get_timeout
+
+    def endpointForURI(self, uri):
+        return CachedDNSEndpoint(uri.host, uri.port, uri.scheme == 'https', self.dns_cache,
+                                 self.get_timeout(uri.host))
+
+
+class HTTPClient(object):
+    """Non-blocking HTTP client for tracker handlers.
+
+    Keeps persistent connections for every tracker host,
+    accepts gzipped content and caches DNS lookups.
+
+    """
+
+    def __init__(self, persistent_per_host=PERSISTENT_PER_HOST):
+        self.pool = HTTPConnectionPool(reactor, persistent=True)
+        self.pool.maxPersistentPerHost = persistent_per_host
+        self.dns_cache = DNSCache()
+        endpoint_factory = CachedDNSEndpointFactory(self.dns_cache, self.get_connect_timeout)
+        agent = Agent.usingEndpointFactory(reactor, endpoint_factory, pool=self.pool)
+        self.agent = ContentDecoderAgent(agent, [('gzip', GzipDecoder)])
+        # Tracker domain -> HostLimiter.
+        self.limiters = {}
+        self.limits_settings = {}
+
+    def configure_limits(self, trackers_settings):
+        """Applies rate limits settings from trackers settings dictionary."""
+        self.limits_settings = trackers_settings
+        for domain, limiter in self.limiters.items():
+            limiter.configure(trackers_settings.get(domain))
+
+    def get_limiter(self, url):
+        """Returns HostLimiter for a tracker the given URL belongs to."""
+        host = get_url_host(url)
+        domain = get_handler_domain(host) or host
+        if domain not in self.limiters:
+            self.limiters[domain] = HostLimiter(self.limits_settings.get(domain))
+        return self.limiters[domain]
+
+    def get_connect_timeout(self, host):
+        """Returns connect timeout for the given host."""
+        return self.get_limiter('http://%s' % host).connect_timeout
+
+    def request(self, url, form_data=None, cookies=None, headers=None, deadline=None):
+        """Requests given URL. Returns a Deferred firing
+        with a tuple: (status code, headers dictionary, body).
+
+        If a dictionary is passed in `form_data` POST HTTP method
+        would be used to pass data to resource (even if that dictionary is empty).
+        `cookies` is a CookieJar to be used and updated by request.
+
+        Requests are rate limited per tracker. Throttled (429, 503) and
+        failed requests are retried honoring `Retry-After` or with
+        exponential backoff. `Retry-After` longer than `breaker_cooldown`
+        opens the breaker instead, and no retry is made if it would
+        wait past `deadline` timestamp. `HostUnavailable` failure is
+        returned when tracker requests are suspended by circuit breaker.
+        Every attempt is limited by connect and read timeouts, and
+        by `deadline` if set (`RequestTimeout` failure).
+
+        """
+        limiter = self.get_limiter(url)
+        if limiter.is_open():
+            return defer.fail(HostUnavailable(url))
+        return self._request_limited(limiter, 0, deadline, url, form_data, cookies, headers)
+
+    def stream(self, url, form_data=None, cookies=None, headers=None, deadline=None):
+        """Same as `request()` but response body is not read beforehand.
+        Returns a Deferred firing with a tuple:
+        (status code, headers dictionary, BodyStream object).
+
+        Error and throttling responses bodies are still read
+        at once, so that connections are released.
+        Whole body should be received within read timeout
+        and before `deadline` if set.
+
+        """
+        limiter = self.get_limiter(url)
+        if limiter.is_open():
+            return defer.fail(HostUnavailable(url))
+        return self._request_limited(limiter, 0, deadline, url, form_data, cookies, headers, limiter.read_timeout, deadline)
+
+    def _request_limited(self, limiter, attempt, deadline, *args):
+        """Issues a request when limiter allows, retrying if necessary."""
+
+        def can_retry(delay):
+            return attempt < limiter.max_retries and (deadline is None or time.time() + delay < deadline)
+
+        def retry(delay):
+            limiter.pause(delay)
+            return self._request_limited(limiter, attempt + 1, deadline, *args)
+
+        def on_response(result):
+            code, response_headers = result[:2]
+            if code in RETRY_CODES:
+                delay = parse_retry_after(response_headers.get('retry-after'))
+                if delay is not None and delay > limiter.breaker_cooldown:
+                    # Host is skipped rather than waited for that long.
+                    limiter.suspend()
+                    return result
+                if delay is None:
+                    delay = limiter.get_backoff(attempt)
+                if can_retry(delay):
+                    log.debug('Updatorr got HTTP %s from %s, retrying in %s seconds' % (code, args[0], delay))
+                    return retry(delay)
+                limiter.failure()
+            elif code >= 500:
+                limiter.failure()
+            else:
+                limiter.success()
+            return result
+
+        def on_error(failure):
+            if failure.check(defer.CancelledError):
+                return failure
+            if deadline is not None and time.time() >= deadline:
+                # Timed out by walk deadline, that's not the host to blame.
+                return failure
+            delay = limiter.get_backoff(attempt)
+            if can_retry(delay):
+                return retry(delay)
+            limiter.failure()
+            return failure
+
+        def request():
+            d = self._request(*args)
+            timeout = limiter.read_timeout
+            if deadline is not None:
+                timeout = max(0, min(timeout, deadline - time.time()))
+            timeout_call = reactor.callLater(timeout, d.cancel)
+
+            def on_done(result):
+                if timeout_call.active():
+                    timeout_call.cancel()
+                elif isinstance(result, Failure) and result.check(defer.CancelledError):
+                    # Cancelled by timeout rather than by caller.
+                    return Failure(RequestTimeout(args[0]))
+                return result
+
+            return d.addBoth(on_done)
+
+        wait = limiter.acquire()
+        if deadline is not None and time.time() + wait >= deadline:
+            return defer.fail(RequestTimeout(args[0]))
+        d = deferLater(reactor, wait, request)
+        d.addCallbacks(on_response, on_error)
+        return d
+
+    def _request(self, url, form_data=None, cookies=None, headers=None, stream_timeout=None, deadline=None):
+        """Issues a single request. See `request()`.
+        If `stream_timeout` is set response body is streamed (see `stream()`).
+
+        """
+        agent = self.agent
+        if cookies is not None:
+            agent = CookieAgent(agent, cookies)
+        # Redirects are followed hop by hop, so that cookies from
+        # every intermediate response are stored.
+        agent = BrowserLikeRedirectAgent(agent)
+
+        request_headers = Headers({'User-Agent': [USER_AGENT]})
+        for name, value in (headers or {}).items():
+            request_headers.setRawHeaders(name, [value])
+
+        method = 'GET'
+        body = None
+        if form_data is not None:
+            method = 'POST'
+            request_headers.setRawHeaders('Content-Type', ['application/x-www-form-urlencoded'])
+            body = FileBodyProducer(StringIO(urlencode(form_data)))
+
+        d = agent.request(method, url, request_headers, body)
+        d.addCallback(self._read_response, stream_timeout, deadline)
+        return d
+
+    def _read_response(self, response, stream_timeout=None, deadline=None):
+        """Reads response body. Returns a Deferred firing
+        with a tuple: (status code, headers dictionary, body).
+        If `stream_timeout` is set and response is successful
+        body is a BodyStream object (limited with `deadline`).
+
+        """
+        response_headers = {}
+        for name, values in response.headers.getAllRawHeaders():
+            response_headers[name.lower()] = values[-1]
+
+        if stream_timeout is not None and response.code < 400:
+            return response.code, response_headers, BodyStream(response, timeout=stream_timeout, deadline=deadline)
+
+        def on_body(body):
+            if stream_timeout is not None:
+                body = BodyStream(body=body)
+            return response.code, response_headers, body
+
+        def on_partial(failure):
+            # Servers not telling content length are not that rare.
+            failure.trap(PartialDownloadError)
+            return on_body(failure.value.response)
+
+        return readBody(response).addCallbacks(on_body, on_partial)
+
+    def close(self):
+        """Closes persistent connections."""
+        return self.pool.closeCachedConnections()
+
+
+class _QueueProtocol(Protocol):
+    """Puts response body chunks into a queue consumed by another thread.
+    None is put when body is over.
+
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.finished = False
+
+    def dataReceived(self, data):
+        self.queue.put(data)
+
+    def connectionLost(self, reason):
+        self.finished = True
+        self.queue.put(None)
+
+    def stop(self):
+        """Stops body receiving."""
+        if not self.finished:
+            self.transport.stopProducing()
+
+
+class BodyStream(object):
+    """Response body chunks iterator to be used in a thread
+    other than reactor's one, so that body could be processed
+    while it is being received, and dropped when it's no longer needed.
+
+    Whole body should be received within `timeout` seconds and
+    before `deadline` timestamp if given, so that a slowly dripping
+    response doesn't hold a walker thread.
+
+    """
+
+    def __init__(self, response=None, body=None, timeout=60, deadline=None):
+        self.timeout = timeout
+        self.expires = time.time() + timeout
+        if deadline is not None:
+            self.expires = min(self.expires, deadline)
+        self._queue = Queue()
+        self._protocol = None
+        if response is None:
+            if body:
+                self._queue.put(body)
+            self._queue.put(None)
+        else:
+            self._protocol = _QueueProtocol(self._queue)
+            response.deliverBody(self._protocol)
+
+    def __iter__(self):
+        while True:
+            remaining = self.expires - time.time()
+            try:
+                chunk = self._queue.get(timeout=max(0, remaining))
+            except Empty:
+                chunk = Empty
+            if chunk is None:
+                return
+            if chunk is Empty or remaining <= 0:
+                # Chunks queued after time is out are dropped too.
+                self.close()
+                raise RequestTimeout('Response body is not received in time')
+            yield chunk
+
+    def read(self):
+        """Returns the whole body."""
+        return ''.join(self)
+
+    def close(self):
+        """Stops receiving body if it's not received yet."""
+        if self._protocol is not None and not self._protocol.finished:
+            reactor.callFromThread(self._protocol.stop)
+
+
+_CLIENT = None
+
+
+def get_client():
+    """Returns shared HTTPClient object."""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = HTTPClient()
+    return _CLIENT
+
+
+def blocking_request(url, form_data=None, cookies=None, headers=None, deadline=None):
+    """Synchronous compatibility shim for HTTPClient.request().
+    Should be called from a thread other than reactor's one.
+
+    """
+    if threadable.isInIOThread():
+        raise RuntimeError('Blocking request is issued from reactor thread')
+    return threads.blockingCallFromThread(reactor, get_client().request, url, form_data, cookies, headers, deadline)
+
+
+def blocking_stream(url, form_data=None, cookies=None, headers=None, deadline=None):
+    """Synchronous compatibility shim for HTTPClient.stream().
+    Should be called from a thread other than reactor's one.
+
+    """
+    if threadable.isInIOThread():
+        raise RuntimeError('Blocking request is issued from reactor thread')
+    return threads.blockingCallFromThread(reactor, get_client().stream, url, form_data, cookies, headers, deadline)
@@ -0,0 +1,40 @@
+import threading
+
+import deluge.configmanager
+
+
+class PageCache(object):
+    """On-disk cache holding tracker thread pages state
+    (HTTP validators, content fingerprint and info-hashes
+    of torrents confirmed against the page) keyed by page URL.
+
+    Stored in ~/.config/deluge/updatorr.cache.conf.
+
+    """
+
+    def __init__(self, filename='updatorr.cache.conf'):
+        self.config = deluge.configmanager.ConfigManager(filename, {'pages': {}})
+        self.pages = self.config['pages']
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns a dictionary with stored state for page at given URL."""
+        with self._lock:
+            return dict(self.pages.get(url, {}))
+
+    def set(self, url, state):
+        """Stores state for page at given URL.
+        Empty state removes page from cache.
+
+        """
+        with self._lock:
+            if state:
+                self.pages[url] = dict(state)
+            elif url in self.pages:
+                del self.pages[url]
+
+    def save(self):
+        """Dumps cache to file system."""
+        with self._lock:
+            self.config['pages'] = self.pages
+            self.config.save()
@@ -0,0 +1,202 @@
+import time
+import heapq
+import random
+import threading
+
+
+class UpdatesScheduler(object):
+    """Per-torrent updates checks scheduler.
+
+    Every torrent has its own check interval adapted to its update history:
+    interval is halved when torrent is updated, and is doubled (exponential
+    backoff) while torrent stays unchanged. Intervals are kept within
+    [base / MIN_DIVISOR, base * MAX_FACTOR] where base is the walk period.
+
+    Due torrents are kept in a heap ordered by their next check time.
+
+    """
+
+    MIN_DIVISOR = 4
+    MAX_FACTOR = 4
+    BACKOFF_FACTOR = 2
+
+    def __init__(self, base_interval, state=None, jitter=0):
+        # Fraction of interval next check time is randomly shifted by.
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._heap = []
+        # Torrents given away for checks but not yet rescheduled.
+        self._pending = set()
+        # torrent_id -> {'interval', 'next_check', 'last_check', 'last_update'}
+        self.state = {}
+        self.base_interval = base_interval
+        for torrent_id, item in (state or {}).items():
+            self.state[torrent_id] = dict(item)
+            heapq.heappush(self._heap, (item['next_check'], torrent_id))
+
+    def clamp_interval(self, interval):
+        """Returns interval limited by the allowed bounds."""
+        return min(max(interval, self.base_interval / float(self.MIN_DIVISOR)), self.base_interval * self.MAX_FACTOR)
+
+    def _push(self, torrent_id, next_check):
+        self.state[torrent_id]['next_check'] = next_check
+        heapq.heappush(self._heap, (next_check, torrent_id))
+
+    def add(self, torrent_id, next_check=None):
+        """Schedules a torrent for checks if it is not scheduled yet.
+        By default torrent is due right away.
+
+        """
+        with self._lock:
+            if torrent_id in self.state:
+                return
+            self.state[torrent_id] = {'interval': self.base_interval, 'last_check': 0, 'last_update': 0}
+            if next_check is None:
+                next_check = time.time()
+            self._push(torrent_id, next_check)
+
+    def remove(self, torrent_id):
+        """Removes a torrent from schedule."""
+        with self._lock:
+            self.state.pop(torrent_id, None)
+            self._pending.discard(torrent_id)
+
+    def rename(self, torrent_id, new_torrent_id):
+        """Moves schedule state of a torrent to a new torrent ID
+        (e.g. when a torrent is replaced with an updated one).
+
+        """
+        with self._lock:
+            if torrent_id not in self.state:
+                return
+            self.state[new_torrent_id] = self.state.pop(torrent_id)
+            self._push(new_torrent_id, self.state[new_torrent_id]['next_check'])
+            if torrent_id in self._pending:
+                self._pending.discard(torrent_id)
+                self._pending.add(new_torrent_id)
+
+    def pop_due(self, now=None, limit=None):
+        """Returns a list of torrent IDs due to be checked.
+        Those are considered pending until rescheduled with `checked()`
+        or `reschedule_pending()`.
+
+        """
+        if now is None:
+            now = time.time()
+        due = []
+        with self._lock:
+            while self._heap and (limit is None or len(due) < limit):
+                next_check, torrent_id = self._heap[0]
+                item = self.state.get(torrent_id)
+                if item is None or item['next_check'] != next_check or torrent_id in self._pending:
+                    # Stale heap entry.
+                    heapq.heappop(self._heap)
+                    continue
+                if next_check > now:
+                    break
+                heapq.heappop(self._heap)
+                self._pending.add(torrent_id)
+                due.append(torrent_id)
+        return due
+
+    def checked(self, torrent_id, updated=None, now=None):
+        """Reschedules a torrent after its check.
+
+        `updated` is True if torrent was updated, False if it is up-to-date,
+        and None if check has failed (interval is not changed then).
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            item = self.state.get(torrent_id)
+            if item is None:
+                return
+            self._pending.discard(torrent_id)
+            interval = item['interval']
+            if updated:
+                interval /= float(self.BACKOFF_FACTOR)
+                item['last_update'] = now
+            elif updated is not None:
+                interval *= self.BACKOFF_FACTOR
+            item['interval'] = self.clamp_interval(interval)
+            item['last_check'] = now
+            shift = item['interval'] * random.uniform(-self.jitter, self.jitter)
+            self._push(torrent_id, now + item['interval'] + shift)
+
+    def spread_due(self, window, now=None):
+        """Spreads torrents already due evenly across `window` seconds
+        with randomized jitter, so that they are not checked in a burst.
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            due = [torrent_id for torrent_id, item in self.state.items()
+                   if item['next_check'] <= now and torrent_id not in self._pending]
+            if not due:
+                return
+            random.shuffle(due)
+            slot = window / float(len(due))
+            for idx, torrent_id in enumerate(due):
+                self._push(torrent_id, now + slot * idx + random.uniform(0, slot))
+
+    def count_cycle(self, start, end):
+        """Returns a tuple (checked, due): a number of torrents checked
+        since `start`, and a number of torrents not checked since then
+        due before `end` (including pending ones).
+
+        """
+        checked = due = 0
+        with self._lock:
+            for torrent_id, item in self.state.items():
+                if item['last_check'] >= start:
+                    checked += 1
+                elif item['next_check'] < end or torrent_id in self._pending:
+                    due += 1
+        return checked, due
+
+    def requeue(self, torrent_id, now=None):
+        """Puts a pending torrent back to be due right away
+        (e.g. when a walk is interrupted before its check).
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if torrent_id not in self.state:
+                return
+            self._pending.discard(torrent_id)
+            self._push(torrent_id, now)
+
+    def reschedule_pending(self):
+        """Reschedules pending torrents not checked
+        for any reason with their current intervals.
+
+        """
+        with self._lock:
+            pending = list(self._pending)
+        for torrent_id in pending:
+            self.checked(torrent_id)
+
+    def get_last_check(self, torrent_id):
+        """Returns the last check time of a torrent (0 if never checked)."""
+        with self._lock:
+            item = self.state.get(torrent_id)
+            if item is None:
+                return 0
+            return item['last_check']
+
+    def get_next_check(self):
+        """Returns the earliest next check time or None."""
+        with self._lock:
+            next_checks = [item['next_check'] for torrent_id, item in self.state.items()
+                           if torrent_id not in self._pending]
+        if not next_checks:
+            return None
+        return min(next_checks)
+
+    def get_state(self):
+        """Returns a dictionary with schedule state suitable for serialization."""
+        with self._lock:
+            return dict((torrent_id, dict(item)) for torrent_id, item in self.state.items())
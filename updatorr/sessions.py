@@ -0,0 +1,87 @@
+import threading
+
+from updatorr.utils import Cookies
+
+
+class TrackerSession(object):
+    """Login session (cookies and authenticated state)
+    shared by all handlers of a tracker host.
+
+    """
+
+    def __init__(self, host, cookies):
+        self.host = host
+        self.cookies = cookies
+        self.logged_in = False
+        # Incremented on every login attempt, lets handlers know
+        # that somebody has logged in since they've got a page.
+        self.generation = 0
+        self._login_lock = threading.Lock()
+
+    def is_logged_in(self, cookie_name):
+        """Returns boolean to identify whether session is authenticated:
+        either login was successful, or a valid login cookie is set.
+
+        """
+        if self.logged_in:
+            return True
+        if cookie_name is None:
+            return False
+        cookie = self.cookies.get_cookie(cookie_name)
+        return cookie is not None and not cookie.is_expired()
+
+    def invalidate(self, generation):
+        """Drops authenticated state, e.g. when a handler got a "guest" page.
+        `generation` is a session generation the page was got within.
+
+        """
+        if generation == self.generation:
+            self.logged_in = False
+
+    def login(self, do_login, generation):
+        """Logs in with `do_login` callable unless somebody has already
+        done that since `generation`. Concurrent logins are collapsed
+        into a single one in flight. Returns login result.
+
+        """
+        with self._login_lock:
+            if generation != self.generation:
+                return self.logged_in
+            try:
+                self.logged_in = bool(do_login())
+            finally:
+                self.generation += 1
+            return self.logged_in
+
+
+class SessionManager(object):
+    """Registry of tracker sessions by host."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, host, cookies_dict=None):
+        """Returns a session for the given host. New sessions
+        are initialized with cookies data from `cookies_dict`.
+
+        """
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = TrackerSession(host, Cookies(init_from_dict=cookies_dict or None))
+            return self._sessions[host]
+
+    def get_sessions(self):
+        """Returns a dictionary of sessions by host."""
+        with self._lock:
+            return dict(self._sessions)
+
+    def reset_session(self, host, cookies_dict=None):
+        """Replaces a session for the given host with a new one."""
+        with self._lock:
+            self._sessions.pop(host, None)
+        return self.get_session(host, cookies_dict)
+
+
+# Sessions shared by tracker handlers.
+SESSIONS = SessionManager()
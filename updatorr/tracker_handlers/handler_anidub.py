@@ -9,18 +9,22 @@ class AnidubHandler(GenericPrivateTrackerHandler):
 
     login_url = 'http://tr.anidub.com/takelogin.php'
     cookie_logged_in = 'uid'
+    # Download link, info-hash and description rows of torrent details,
+    # up to the type row (marker is the Russian 'Type' label in windows-1251)
+    # followed by seeders, views and downloads counters.
+    fingerprint_start = 'download.php?id='
+    fingerprint_end = '>\xd2\xe8\xef<'
 
     def get_download_link(self):
         """Tries to find .torrent file download link at forum thread page
         and return that one."""
-        response, page_html = self.get_resource(self.resource_url)
-        page_links = self.find_links(page_html)
+        page_links = self.scan_page(lambda link: 'download.php?id=' in link or 'login.php?returnto=' in link)
         download_link = None
         for page_link in page_links:
             if 'login.php?returnto=' in page_link:
                 download_link = None
                 self.debug('Login is required to download torrent file.')
-                if self.login(self.get_settings('login'), self.get_settings('password')):
+                if self.relogin():
                     download_link = self.get_download_link()
             if 'download.php?id=' in page_link:
                 download_link = 'http://tr.anidub.com/%s' % urllib2.unquote(page_link).replace('&amp;', '&')
@@ -1,3 +1,7 @@
+import json
+
+from urlparse import urlsplit, parse_qs
+
 from updatorr.handler_base import GenericPrivateTrackerHandler
 from updatorr.utils import register_tracker_handler
 
@@ -6,22 +10,68 @@ class RutrackerHandler(GenericPrivateTrackerHandler):
     """This class implements .torrent files downloads
     for http://rutracker.org tracker."""
 
+    concurrency = 4
+    # Magnet link is shown to guests right after download link.
+    guest_magnet = True
+    magnet_lookahead = 8192
+    # Release description of the first post, up to the attachment
+    # table with downloads and peers counters.
+    fingerprint_start = 'class="post_body"'
+    fingerprint_end = 'class="attach'
     login_url = 'http://login.rutracker.org/forum/login.php'
     cookie_logged_in = 'bb_data'
+    # Public API offering info-hashes lookups (may be overridden with `api_url` tracker setting).
+    api_url = 'http://api.rutracker.org/v1/get_tor_hash'
 
     def get_login_form_data(self, login, password):
         """Returns a dictionary with data to be pushed to authorization form."""
         return {'login_username': login, 'login_password': password, 'login': 'pushed'}
 
+    def get_topic_id(self, url):
+        """Returns forum thread identifier from thread URL or None."""
+        topic_ids = parse_qs(urlsplit(url).query).get('t')
+        if not topic_ids:
+            return None
+        return topic_ids[0]
+
+    def get_info_hashes(self, urls):
+        """Returns current info-hashes of torrents from the given
+        forum thread URLs using rutracker API: {url: hex hash}.
+
+        """
+        topics = {}
+        for url in urls:
+            topic_id = self.get_topic_id(url)
+            if topic_id is not None:
+                topics[topic_id] = url
+        if not topics:
+            return {}
+
+        api_url = self.get_settings('api_url') or self.api_url
+        contents = self.get_resource('%s?by=topic_id&val=%s' % (api_url, ','.join(topics)))[1]
+        try:
+            result = json.loads(contents)['result']
+        except (ValueError, KeyError, TypeError):
+            result = None
+        if not isinstance(result, dict) or \
+                not all(info_hash is None or isinstance(info_hash, basestring) for info_hash in result.values()):
+            self.debug('Unable to get info-hashes from %s' % api_url)
+            return None
+
+        info_hashes = {}
+        for topic_id, info_hash in result.items():
+            if info_hash and topic_id in topics:
+                info_hashes[topics[topic_id]] = info_hash.lower()
+        return info_hashes
+
     def before_download(self):
         """Used to perform some required actions right before .torrent download."""
-        self.set_cookie('bb_dl', self.get_id_from_link())  # A check that user himself have visited torrent's page ;)
+        self.set_cookie('bb_dl', self.get_id_from_link(), transient=True)  # A check that user himself have visited torrent's page ;)
 
     def get_download_link(self):
         """Tries to find .torrent file download link at forum thread page
         and return that one."""
-        response, page_html = self.get_resource(self.resource_url)
-        page_links = self.find_links(page_html)
+        page_links = self.scan_page(lambda link: 'dl.rutracker.org' in link)
         download_link = None
         for page_link in page_links:
             if 'dl.rutracker.org' in page_link:
@@ -29,7 +79,7 @@ class RutrackerHandler(GenericPrivateTrackerHandler):
                 if 'guest' in download_link:
                     download_link = None
                     self.debug('Login is required to download torrent file.')
-                    if self.login(self.get_settings('login'), self.get_settings('password')):
+                    if self.relogin():
                         download_link = self.get_download_link()
                 break
         return download_link
@@ -1,11 +1,14 @@
+import re
 import time
 import os
+import hashlib
+import threading
 
-from collections import defaultdict
-from cookielib import CookieJar
-from copy import deepcopy
+from collections import deque, OrderedDict
+from urlparse import urlparse, urlsplit, urlunsplit
+from cookielib import CookieJar, Cookie
 
-from deluge._libtorrent import lt
+from deluge.common import is_url
 
 import logging
 log = logging.getLogger(__name__)
@@ -13,6 +16,9 @@ log = logging.getLogger(__name__)
 # Torrent tracker handler classes registry.
 TRACKER_HANDLERS = {}
 
+# This regex is used to get hyperlink from torrent comment.
+RE_COMMENT_URL = re.compile(r'(?P<url>https?://[^\s]+)')
+
 
 def register_tracker_handler(domain_name, handler_callable):
     """Registers a tracker handler class with some domain name."""
@@ -27,13 +33,67 @@ def get_registered_handlers(domain=None):
     return TRACKER_HANDLERS.get(domain)
 
 
+def get_url_host(url):
+    """Returns lowercased host name from the given URL.
+    Bare host names are also accepted.
+
+    """
+    if '://' not in url:
+        url = 'http://%s' % url
+    return (urlparse(url.strip()).hostname or '').lower()
+
+
+def normalize_url(url):
+    """Returns URL normalized to find torrents sharing a forum thread:
+    scheme and host are lowercased, default port and fragment are
+    dropped, and query parameters are sorted.
+
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = '&'.join(sorted(param for param in parts.query.split('&') if param))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def get_handler_domain(host):
+    """Returns a domain a tracker handler is registered with
+    for the given host, matching domain suffixes
+    (so that both `login.rutracker.org` and `rutracker.org`
+    resolve into `rutracker.org`). Returns None if not found.
+
+    """
+    labels = host.split('.')
+    for idx in range(len(labels)):
+        domain = '.'.join(labels[idx:])
+        if domain in TRACKER_HANDLERS:
+            return domain
+    return None
+
+
+def get_comment_url(comment):
+    """Returns normalized forum thread URL from torrent comment
+    or None if there is no URL.
+
+    """
+    match = RE_COMMENT_URL.search(comment or '')
+    if match is None or not is_url(match.group('url')):
+        return None
+    return normalize_url(match.group('url'))
+
+
 def get_tracker_handler(torrent_data, logger):
     """Returns an appropriate torrent tracker handler object
-    from handlers dictionary basing on resource_url."""
-    for host_name in TRACKER_HANDLERS.keys():
-        if host_name in torrent_data['comment']:
-            return TRACKER_HANDLERS[host_name](host_name, torrent_data, logger)
-    return None
+    from handlers dictionary basing on resource_url host.
+
+    """
+    domain = get_handler_domain(get_url_host(torrent_data['comment']))
+    handler_cls = TRACKER_HANDLERS.get(domain)
+    if handler_cls is None:
+        return None
+    return handler_cls(domain, torrent_data, logger)
 
 
 def read_torrent_file(filepath):
@@ -44,50 +104,200 @@ def read_torrent_file(filepath):
     return contents
 
 
+def is_torrent_filepath(value):
+    """Returns boolean to identify whether given string is a path
+    to an existing file rather than .torrent file contents
+    (some handlers return paths to temporary .torrent files).
+
+    """
+    return len(value) < 4096 and '\0' not in value and os.path.isfile(value)
+
+
+def _bencode_skip(contents, pos):
+    """Returns position right after bencoded value
+    starting at `pos` in `contents` without decoding it.
+
+    Nested values are walked iteratively, which is faster than recursion
+    for torrents with thousands of files and is not limited in depth.
+    Raises ValueError or IndexError on malformed contents.
+
+    """
+    index = contents.index
+    depth = 0
+    while True:
+        char = contents[pos]
+        if char == 'e':
+            depth -= 1
+            pos += 1
+        elif char == 'l' or char == 'd':
+            depth += 1
+            pos += 1
+            continue
+        elif char == 'i':
+            pos = index('e', pos) + 1
+        else:
+            colon = index(':', pos)
+            pos = colon + 1 + int(contents[pos:colon])
+            if pos <= colon:
+                raise ValueError('Negative string length at %s' % colon)
+        if depth <= 0:
+            return pos
+
+
+def get_info_hash(file_contents):
+    """Returns torrent info hash from .torrent file contents.
+
+    Raw `info` dictionary bytes are located by bencode scanning
+    and hashed as is, without decoding torrent metadata.
+    Raises ValueError if contents is not a bencoded dictionary
+    with `info` dictionary (e.g. an html page).
+
+    """
+    if file_contents[:1] != 'd':
+        raise ValueError('Torrent contents is not a bencoded dictionary')
+    pos = 1
+    try:
+        while file_contents[pos] != 'e':
+            key_start = file_contents.index(':', pos) + 1
+            value_start = _bencode_skip(file_contents, pos)
+            value_end = _bencode_skip(file_contents, value_start)
+            if value_end > len(file_contents):
+                break
+            if file_contents[key_start:value_start] == 'info' and file_contents[value_start] == 'd':
+                return hashlib.sha1(memoryview(file_contents)[value_start:value_end]).hexdigest()
+            pos = value_end
+    except (ValueError, IndexError):
+        raise ValueError('Torrent contents is malformed')
+    raise ValueError('No info dictionary found in torrent contents')
+
+
+def _bdecode(contents, pos):
+    """Returns a tuple (decoded value, position right after it)
+    for bencoded value starting at `pos` in `contents`.
+
+    """
+    char = contents[pos]
+    if char == 'i':
+        end = contents.index('e', pos)
+        return int(contents[pos + 1:end]), end + 1
+    if char == 'l' or char == 'd':
+        pos += 1
+        items = []
+        while contents[pos] != 'e':
+            item, pos = _bdecode(contents, pos)
+            items.append(item)
+        if char == 'l':
+            return items, pos + 1
+        if len(items) % 2:
+            raise ValueError('Dictionary key without value at %s' % pos)
+        return dict(zip(items[::2], items[1::2])), pos + 1
+    colon = contents.index(':', pos)
+    end = colon + 1 + int(contents[pos:colon])
+    if end <= colon or end > len(contents):
+        raise ValueError('Bad string length at %s' % colon)
+    return contents[colon + 1:end], end
+
+
+def bdecode(contents):
+    """Returns a value decoded from bencoded string.
+    Raises ValueError if contents is malformed.
+
+    """
+    try:
+        value, end = _bdecode(contents, 0)
+    except (ValueError, IndexError, RuntimeError):
+        raise ValueError('Bencoded contents is malformed')
+    if end != len(contents):
+        raise ValueError('Bencoded contents has trailing data')
+    return value
+
+
+def get_torrent_files(file_contents):
+    """Returns a list of paths of files within a torrent
+    from .torrent file contents, as libtorrent lists those:
+    torrent name is the root directory of multi-file torrents.
+
+    Pure-Python, so that it is safe to run in worker processes.
+
+    """
+    info = bdecode(file_contents)['info']
+
+    def get_text(item, key):
+        return item.get('%s.utf-8' % key, item[key])
+
+    name = get_text(info, 'name')
+    if 'files' not in info:
+        paths = [name]
+    else:
+        paths = [os.sep.join([name] + get_text(a_file, 'path')) for a_file in info['files']]
+    return [path.decode('utf-8', 'replace') for path in paths]
+
+
+class TorrentInfo(dict):
+    """Dictionary with basic information from torrent contents.
+    Files list is decoded lazily on the first access.
+
+    """
+
+    def __init__(self, file_contents):
+        dict.__init__(self, hash=get_info_hash(file_contents))
+        self._contents = file_contents
+
+    def __missing__(self, key):
+        if key != 'files':
+            raise KeyError(key)
+        self['files'] = get_torrent_files(self._contents)
+        return self['files']
+
+
 def read_torrent_info(file_contents):
     """Returns a dictionary with basic information from torrent
     contents (see `read_torrent_file()`).
 
     Dict keys:
         hash - Torrent hash.
-        files - A list of files within the torrent.
+        files - A list of files within the torrent (decoded on demand).
 
     """
-    info_contents = lt.torrent_info(lt.bdecode(file_contents))
-    files_from_torrent = [a_file.path.decode('utf-8') for a_file in info_contents.files()]
-    info = {'hash': str(info_contents.info_hash()), 'files': files_from_torrent}
-    return info
+    return TorrentInfo(file_contents)
+
+
+# Torrent status keys copied into a new torrent session options: (status key, option key).
+NEW_PREFS_MAP = (
+    ('max_connections', 'max_connections_per_torrent'),
+    ('max_upload_slots', 'max_upload_slots_per_torrent'),
+    ('max_upload_speed', 'max_upload_speed_per_torrent'),
+    ('max_download_speed', 'max_download_speed_per_torrent'),
+    ('prioritize_first_last', 'prioritize_first_last_pieces'),
+    ('is_auto_managed', 'auto_managed'),
+    ('stop_at_ratio', 'stop_at_ratio'),
+    ('stop_ratio', 'stop_ratio'),
+    ('remove_at_ratio', 'remove_at_ratio'),
+    ('move_on_completed', 'move_completed'),
+    ('move_on_completed_path', 'move_completed_path'),
+)
+
+# Torrent status keys required to check and update a torrent.
+TORRENT_STATUS_KEYS = ['name', 'comment', 'hash', 'save_path', 'files', 'file_priorities'] + \
+                      [status_key for status_key, option_key in NEW_PREFS_MAP]
 
 
 def get_new_prefs(full_prefs, new_torrent_info):
     """Returns a dictionary with preferences for a new torrent session.
-    Those preferences are deduces from full preferences of previous
-    session of that torrent.
+    Those preferences are deduces from preferences of previous
+    session of that torrent (status with `TORRENT_STATUS_KEYS`).
 
     Those files that were marked as "not to download" in previous session
     whold have the same priority in a new one. Basically all files priorities
     are copied from the previous session.
 
     """
-    
-    new_prefs = deepcopy(full_prefs)
-
-    # These are some items we definitely do not want in a new session.
-    info_to_drop = (
-        'comment', 'hash', 'peers', 'progress', 'num_seeds', 'ratio', 'total_peers', 'total_wanted',
-        'distributed_copies', 'time_added', 'active_time', 'next_announce',
-        'tracker', 'tracker_host', 'tracker_status', 'trackers',
-        'files', 'file_priorities', 'file_progress', 'num_files',
-        'is_seed', 'seed_rank', 'seeding_time', 'download_payload_rate', 'message',
-        'num_peers', 'compact', 'total_uploaded', 'total_done', 'num_pieces',
-        'total_payload_download', 'total_seeds', 'piece_length', 'all_time_download',
-        'name', 'seeds_peers_ratio', 'eta', 'is_finished', 'total_size', 'state', 'upload_payload_rate',)
+    new_prefs = {}
+    for status_key, option_key in NEW_PREFS_MAP:
+        if status_key in full_prefs:
+            new_prefs[option_key] = full_prefs[status_key]
 
-    for pref_name in info_to_drop:
-        if pref_name in new_prefs:
-            del new_prefs[pref_name]
-
-    new_prefs['download_location'] = new_prefs['save_path']
+    new_prefs['download_location'] = full_prefs['save_path']
     new_prefs['mapped_files'] = {}
     new_prefs['file_priorities'] = []
 
@@ -129,6 +339,229 @@ def get_files_priorities(torrent_data):
     return files
 
 
+class WorkerPool(object):
+    """Bounded pool of worker threads additionally limiting
+    concurrency within groups of items (e.g. tracker hosts).
+
+    """
+
+    def __init__(self, max_workers, group_limits=None, default_group_limit=1):
+        self.max_workers = max(1, int(max_workers))
+        self.default_group_limit = default_group_limit
+        self._semaphores = {}
+        for group, limit in (group_limits or {}).items():
+            self._semaphores[group] = threading.BoundedSemaphore(max(1, int(limit)))
+        self._semaphores_lock = threading.Lock()
+
+    def get_semaphore(self, group):
+        """Returns a semaphore limiting concurrency for the given group."""
+        with self._semaphores_lock:
+            if group not in self._semaphores:
+                self._semaphores[group] = threading.BoundedSemaphore(self.default_group_limit)
+            return self._semaphores[group]
+
+    def map(self, target, items, get_group, deadline=None):
+        """Calls `target` for every item from `items` using pool threads.
+        `get_group` callable should return a group for an item.
+        Blocks until every item is processed or `deadline`
+        (timestamp) is reached.
+
+        Items of a group at its limit wait in the queue without taking
+        a pool thread, so that threads process other groups meanwhile.
+
+        Returns a list of items left unprocessed due to deadline.
+
+        """
+        # Group -> items queue. Groups take turns, so that items are interleaved.
+        queues = OrderedDict()
+        for item in items:
+            queues.setdefault(get_group(item), deque()).append(item)
+        items_count = sum(len(group_items) for group_items in queues.values())
+
+        condition = threading.Condition()
+        skipped = []
+
+        def take():
+            # Returns (group, item, acquired semaphore) or None if nothing is left.
+            with condition:
+                while queues:
+                    if deadline is not None and time.time() >= deadline:
+                        for group_items in queues.values():
+                            skipped.extend(group_items)
+                        queues.clear()
+                        break
+                    for group in queues.keys():
+                        semaphore = self.get_semaphore(group)
+                        if semaphore.acquire(False):
+                            group_items = queues.pop(group)
+                            item = group_items.popleft()
+                            if group_items:
+                                queues[group] = group_items
+                            return group, item, semaphore
+                    # Every group left is at its limit.
+                    condition.wait()
+                return None
+
+        def work():
+            while True:
+                taken = take()
+                if taken is None:
+                    return
+                group, item, semaphore = taken
+                try:
+                    target(item)
+                except Exception:
+                    log.exception('Updatorr worker failed on %s' % group)
+                finally:
+                    semaphore.release()
+                    with condition:
+                        condition.notify_all()
+
+        threads = []
+        for idx in range(min(self.max_workers, items_count)):
+            thread = threading.Thread(target=work)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return skipped
+
+
+class TorrentsRegistry(object):
+    """Insertion-ordered set of torrent IDs with O(1) membership
+    checks, additions and removals. Serialized into config as a list.
+
+    """
+
+    def __init__(self, torrent_ids=None):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        for torrent_id in torrent_ids or []:
+            self._items[torrent_id] = True
+
+    def __contains__(self, torrent_id):
+        return torrent_id in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def add(self, torrent_id):
+        """Adds torrent ID into registry."""
+        with self._lock:
+            self._items[torrent_id] = True
+
+    def discard(self, torrent_id):
+        """Removes torrent ID from registry if it is there."""
+        with self._lock:
+            self._items.pop(torrent_id, None)
+
+    def to_list(self):
+        """Returns a list of torrent IDs in order of addition."""
+        with self._lock:
+            return list(self._items)
+
+
+class ResourceIndex(object):
+    """Index of torrents forum thread resources built from torrents comments:
+    torrent ID -> (normalized URL, tracker domain, handler class).
+
+    Torrents without URL in comment are not indexed, while domain
+    and handler class are None for URLs of unsupported trackers.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def __contains__(self, torrent_id):
+        return torrent_id in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, torrent_id, comment):
+        """Indexes a torrent by its comment.
+        Returns boolean to identify whether comment holds a URL.
+
+        """
+        url = get_comment_url(comment)
+        with self._lock:
+            if url is None:
+                self._items.pop(torrent_id, None)
+                return False
+            domain = get_handler_domain(get_url_host(url))
+            self._items[torrent_id] = (url, domain, TRACKER_HANDLERS.get(domain))
+        return True
+
+    def discard(self, torrent_id):
+        """Removes torrent from index if it is there."""
+        with self._lock:
+            self._items.pop(torrent_id, None)
+
+    def get(self, torrent_id):
+        """Returns a tuple (URL, domain, handler class) for a torrent or None."""
+        with self._lock:
+            return self._items.get(torrent_id)
+
+    def is_supported(self, torrent_id):
+        """Returns boolean to identify whether a torrent
+        has a URL of a tracker with registered handler.
+
+        """
+        resource = self.get(torrent_id)
+        return resource is not None and resource[2] is not None
+
+    def get_tracker_handler(self, torrent_data, logger):
+        """Returns a tracker handler object for an indexed torrent
+        or None if there is no handler for its tracker.
+
+        """
+        resource = self.get(torrent_data['hash'])
+        if resource is None or resource[2] is None:
+            return None
+        url, domain, handler_cls = resource
+        return handler_cls(domain, torrent_data, logger)
+
+
+class LagMeter(object):
+    """Measures event loop (reactor) lag: a delay of
+    periodic `tick()` calls against their interval.
+
+    """
+
+    def __init__(self, interval=1, window=60):
+        self.interval = interval
+        self._last_tick = None
+        # Lags of the last `window` ticks.
+        self._lags = deque(maxlen=window)
+
+    def tick(self, now=None):
+        """Should be called every `interval` seconds by event loop."""
+        if now is None:
+            now = time.time()
+        if self._last_tick is not None:
+            self._lags.append(max(0.0, now - self._last_tick - self.interval))
+        self._last_tick = now
+
+    def reset(self):
+        """Forgets the last tick time (e.g. when ticks are stopped)."""
+        self._last_tick = None
+
+    def get_stats(self):
+        """Returns a dictionary with the last, maximum
+        and average lag in seconds within the window.
+
+        """
+        lags = list(self._lags)
+        if not lags:
+            return {'last': 0.0, 'max': 0.0, 'avg': 0.0}
+        return {'last': lags[-1], 'max': max(lags), 'avg': sum(lags) / len(lags)}
+
+
 class DummyRequest(object):
     """Fake request object to satisfy CookieJar._cookies_from_attrs_set.
     See ``Cookies`` class.
@@ -146,13 +579,45 @@ class DummyRequest(object):
 
 
 class Cookies(CookieJar):
-    """Wrapper around CookieJar with helper methods."""
+    """Wrapper around CookieJar with helper methods.
+
+    Cookies are indexed by name. The jar is marked `dirty`
+    when a cookie is actually changed, so that it is persisted
+    only when session state changes.
+
+    """
 
     def __init__(self, policy=None, init_from_dict=None):
         CookieJar.__init__(self, policy=policy)
         self._now = int(time.time())
+        # Cookie name -> cookie object.
+        self._index = {}
+        # Names of cookies not worth persisting (e.g. download sentinels).
+        self._transient = set()
+        self.dirty = False
         if init_from_dict is not None:
             self.from_dict(init_from_dict)
+            self.dirty = False
+
+    @staticmethod
+    def _get_state(cookie):
+        return cookie.value, cookie.domain, cookie.path, cookie.expires
+
+    def set_cookie(self, cookie):
+        """Sets a cookie, updating name index and dirty flag."""
+        CookieJar.set_cookie(self, cookie)
+        previous = self._index.get(cookie.name)
+        self._index[cookie.name] = cookie
+        if cookie.name in self._transient:
+            return
+        if previous is None or self._get_state(previous) != self._get_state(cookie):
+            self.dirty = True
+
+    def clear(self, domain=None, path=None, name=None):
+        """Clears cookies, updating name index and dirty flag."""
+        CookieJar.clear(self, domain, path, name)
+        self._index = dict((cookie.name, cookie) for cookie in self)
+        self.dirty = True
 
     def get(self, name, default=None):
         """Returns value for cookie by name.
@@ -160,14 +625,23 @@ class Cookies(CookieJar):
         is returned.
 
         """
-        value = default
-        for cookie in self:
-            if cookie.name==name:
-                return cookie.value
-        return value
+        cookie = self._index.get(name)
+        if cookie is None:
+            return default
+        return cookie.value
+
+    def get_cookie(self, name):
+        """Returns cookie object by name or None if not found."""
+        return self._index.get(name)
 
-    def add(self, name, value, params=None):
-        """Adds cookie into a jar."""
+    def add(self, name, value, params=None, transient=False):
+        """Adds cookie into a jar.
+        Transient cookies do not make the jar dirty
+        and are not serialized.
+
+        """
+        if transient:
+            self._transient.add(name)
         cookie_tuple = [(name, value)]
         if params is not None:
             cookie_tuple.extend(params)
@@ -176,14 +650,33 @@ class Cookies(CookieJar):
             self.set_cookie(cookie)
 
     def to_dict(self):
-        """Converts CookieJar into a dictionary."""
-        output = defaultdict(dict)
+        """Converts CookieJar into a compact dictionary:
+        name -> {value, domain, path, expires}.
+
+        """
+        output = {}
         for cookie in self:
-            for attr in cookie.__dict__:
-                output[cookie.name][attr] = cookie.__dict__[attr]
+            if cookie.name in self._transient:
+                continue
+            output[cookie.name] = {
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expires': cookie.expires,
+            }
         return output
 
     def from_dict(self, source_dict):
-        """Populates CookieJar from a dictionary."""
+        """Populates CookieJar from a dictionary (see `to_dict()`).
+        Extra cookie attributes (as in older Updatorr configs) are ignored.
+
+        """
         for name, props in source_dict.items():
-            self.add(name, props['value'], props.items())
+            domain = props.get('domain') or ''
+            path = props.get('path') or '/'
+            expires = props.get('expires')
+            self.set_cookie(Cookie(
+                version=0, name=name, value=props['value'], port=None, port_specified=False,
+                domain=domain, domain_specified=bool(domain), domain_initial_dot=domain.startswith('.'),
+                path=path, path_specified=True, secure=False, expires=expires,
+                discard=expires is None, comment=None, comment_url=None, rest={}))
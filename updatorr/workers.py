@@ -0,0 +1,91 @@
+import threading
+
+from multiprocessing import Pool
+
+from updatorr.utils import read_torrent_info
+
+import logging
+log = logging.getLogger(__name__)
+
+# Number of worker processes for CPU-bound parts of torrents checks.
+# Workers are forked from multithreaded Deluge daemon, so functions
+# run in them are pure-Python ones (no libtorrent calls, no logging).
+PROCESSES = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_pool(processes=PROCESSES):
+    """Starts a pool of worker processes used by `run()`
+    if it is not started yet.
+
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            log.info('Updatorr Starting %s worker processes' % processes)
+            _pool = Pool(processes)
+
+
+def stop_pool():
+    """Stops a pool of worker processes if any,
+    so that `run()` calls functions in-thread.
+
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+
+def run(func, *args):
+    """Calls `func` with `args` in a worker process if the pool is started,
+    otherwise in the calling thread. Blocks until result is ready.
+
+    Both `func` (a module level function) and `args` should be picklable.
+
+    """
+    pool = _pool
+    if pool is None:
+        return func(*args)
+    return pool.apply(func, args)
+
+
+def summarize_torrent(file_contents, known_hashes=()):
+    """Returns a dictionary with torrent hash from .torrent file contents.
+    Files list is included only if the hash differs from any of `known_hashes`
+    (i.e. some torrent is to be updated). Contents is decoded without libtorrent.
+
+    """
+    torrent_info = read_torrent_info(file_contents)
+    summary = {'hash': torrent_info['hash']}
+    if [known_hash for known_hash in known_hashes if known_hash != summary['hash']]:
+        summary['files'] = torrent_info['files']
+    return summary
+
+
+def scan_links(pattern, kinds, data):
+    """Returns a tuple (links, ends, last end) with links matched
+    by `pattern` in html `data` (see `LinkScanner`).
+
+    If `kinds` are given, links are (kind, named groups dictionary) tuples.
+
+    """
+    links = []
+    ends = []
+    last_end = 0
+    for match in pattern.finditer(data):
+        last_end = match.end()
+        if kinds is None:
+            links.append(match.group(1))
+            ends.append(last_end)
+            continue
+        for kind in kinds:
+            if match.group(kind) is not None:
+                links.append((kind, match.groupdict()))
+                ends.append(last_end)
+                break
+    return links, ends, last_end